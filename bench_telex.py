@@ -0,0 +1,230 @@
+# --- bench_telex.py ---
+# Đo chi phí mỗi phím của bộ gõ Telex với các chuỗi phím bất lợi (URL, mã băm, code rút gọn...).
+# Run: python bench_telex.py [--check] [tên benchmark...] [--baseline vietpy_telex_gui_cu.py]
+
+import os
+import sys
+import time
+import shutil
+import inspect
+import compileall
+import tempfile
+import threading
+import subprocess
+
+import vietpy_telex_core as telex
+
+# Mỗi chuỗi được gõ liền, không có dấu cách, để bộ đệm từ không bao giờ được reset
+ADVERSARIAL_INPUTS = {
+    "url": "https://example.com/duong/dan/rat/dai?tham_so=gia_tri&tra_cuu=nguoi_dung" * 8,
+    "hash": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08" * 8,
+    "minified": "function(a,b){return a.map(function(c){return c*b}).filter(Boolean)};" * 8,
+    "qu_gi": "ququgiaquyegiuquoaquiegiaquy" * 20,
+    "vowels": "aeiouyaaeeooawowuwuoieuyeoa" * 20,
+    "tones": "asfrxjzoowwddaaeeuwowsfrxj" * 20,
+}
+
+CHECK_MAX_GROWTH = 2.0  # phần tư cuối không được chậm hơn phần tư đầu quá 2 lần
+REPEATS = 5
+
+def feed_syllable_state(keys):
+    """Gõ từng phím qua SyllableState (đường đi của hook hiện tại), trả về thời gian từng phím (ns)."""
+    state = telex.SyllableState()
+    timings = []
+    for key in keys:
+        started = time.perf_counter_ns()
+        state.push(key)
+        timings.append(time.perf_counter_ns() - started)
+    return timings
+
+def feed_full_buffer(keys):
+    """Cách cũ: chạy apply_word_telex trên toàn bộ bộ đệm sau mỗi phím."""
+    word = ""
+    timings = []
+    for key in keys:
+        started = time.perf_counter_ns()
+        typed_word = word + key
+        result = telex.apply_word_telex(typed_word)
+        word = result if result and result != typed_word else typed_word
+        timings.append(time.perf_counter_ns() - started)
+    return timings
+
+def quarter_means(keys, feed):
+    """Trung bình ns/phím của phần tư đầu và phần tư cuối (lấy giá trị nhỏ nhất qua REPEATS lần)."""
+    runs = [feed(keys) for _ in range(REPEATS)]
+    timings = [min(samples) for samples in zip(*runs)]
+    quarter = max(1, len(timings) // 4)
+    return sum(timings[:quarter]) / quarter, sum(timings[-quarter:]) / quarter
+
+def bench_adversarial(check=False):
+    # Tắt bảng âm tiết (SyllableState mặc định không có cache) để đo đúng chi phí của bộ quy tắc
+    telex.syllable_table = telex.SyllableTable(path="")
+    failures = []
+    print(f"{'input':<10} {'keys':>5} {'first ns':>10} {'last ns':>10} {'growth':>7} {'old growth':>11}")
+    for name, keys in ADVERSARIAL_INPUTS.items():
+        first, last = quarter_means(keys, feed_syllable_state)
+        old_first, old_last = quarter_means(keys, feed_full_buffer)
+        growth = last / first if first else 1.0
+        old_growth = old_last / old_first if old_first else 1.0
+        print(f"{name:<10} {len(keys):>5} {first:>10.0f} {last:>10.0f} {growth:>6.2f}x {old_growth:>10.2f}x")
+        if growth > CHECK_MAX_GROWTH:
+            failures.append(name)
+    if check and failures:
+        print(f"Per-key cost grows with run length for: {', '.join(failures)}")
+        return False
+    return True
+
+# Một đoạn văn gõ theo kiểu Telex (dấu thanh gõ cuối từ)
+TELEX_SAMPLE = ("Vieetj Nam laf mootj quoocs gia nawmf owr phias ddoong bans ddaor ddoong duwowng "
+                "nguwowif danh nghieeng ddaauf laws nghe tieengs chuyeenj truwowngf hocj khuyeen "
+                "nhuwngx ngayf muwaf thuw ddeen ddowij nguwowif thuwowng nhows queen huwowng")
+
+def bench_emission(check=False):
+    """Gõ TELEX_SAMPLE qua một TelexSession dùng RecordingEmitter: số sự kiện, số lần gọi và ns mỗi lần đổi chữ."""
+    session = telex.TelexSession("recording")
+    recorder = session.emitter
+    transforms = 0
+    started = time.perf_counter_ns()
+    for _ in range(REPEATS):
+        for word in TELEX_SAMPLE.split():
+            session.process_key(None)
+            for key in word:
+                if session.process_key(key): transforms += 1
+    elapsed = time.perf_counter_ns() - started
+    per_transform = transforms or 1
+    print(f"{transforms} transforms, {len(recorder.events) / per_transform:.2f} events, "
+          f"{recorder.calls / per_transform:.2f} emit calls, {elapsed / per_transform:.0f} ns per transform")
+    return True
+
+# Lõi và chế độ --headless phải import được mà không kéo theo GUI; hai file ứng dụng là mốc so sánh
+STARTUP_MODULES = ("vietpy_telex_core", "vietpy_telex_headless", "vietpy_telex_gui", "vietpy_telex")
+HEADLESS_MODULES = STARTUP_MODULES[:2]
+GUI_MODULES = {"keyboard", "PyQt6", "tkinter", "pystray", "PIL", "winsound"}
+BASELINE_MODULE = "vietpy_telex_before_split"
+# Tiến trình con đo bộ nhớ bằng bản sao của peak_memory_kb, không import lõi (lõi tự chiếm vài MB)
+PEAK_MEMORY_SOURCE = inspect.getsource(telex.peak_memory_kb)
+
+def import_profile(module, directory=None, env=None):
+    """
+    Import `module` (từ `directory`, mặc định thư mục này) trong một tiến trình mới với -X importtime; trả về
+    (µs tích lũy, số module, module GUI đã nạp, bộ nhớ cao nhất KB hoặc None) hoặc thông báo lỗi.
+    """
+    code = f"import sys\n{PEAK_MEMORY_SOURCE}\nimport {module}\nprint(peak_memory_kb())"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env,
+                            cwd=directory or os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if result.returncode != 0:
+        return result.stderr.strip().splitlines()[-1]
+    cumulative, names = 0, set()
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        names.add(name)
+        if name == module:
+            cumulative = int(fields[1])
+    peak_kb = result.stdout.strip()
+    return (cumulative, len(names), sorted({name.split(".")[0] for name in names} & GUI_MODULES),
+            int(peak_kb) if peak_kb.isdigit() else None)
+
+def bench_startup(check=False, baseline=None):
+    """
+    Thời gian import và bộ nhớ (lấy nhỏ nhất qua vài lần chạy) của lõi, chế độ headless và hai file ứng dụng.
+    `baseline`: đường dẫn tới vietpy_telex_gui.py trước khi tách lõi (vd: lấy bằng git show), đo thêm làm mốc
+    "trước"; file cũ tạo thư mục cấu hình khi import nên được chạy với HOME/APPDATA trỏ vào thư mục tạm.
+    """
+    ok = True
+    # Ghi sẵn .pyc (kể cả khi đặt PYTHONDONTWRITEBYTECODE): biên dịch lại mỗi lần chạy làm tăng cả thời gian lẫn bộ nhớ
+    compileall.compile_dir(os.path.dirname(os.path.abspath(__file__)), maxlevels=0, quiet=1)
+    print(f"{'module':<26} {'import ms':>10} {'modules':>8} {'peak MB':>8}  gui/hook modules")
+    with tempfile.TemporaryDirectory() as directory:
+        profiles = [(module, (module,)) for module in STARTUP_MODULES]
+        if baseline:
+            shutil.copyfile(baseline, os.path.join(directory, BASELINE_MODULE + ".py"))
+            compileall.compile_dir(directory, maxlevels=0, quiet=1)
+            env = dict(os.environ, HOME=directory, APPDATA=directory, USERPROFILE=directory)
+            profiles.insert(0, ("before split", (BASELINE_MODULE, directory, env)))
+        for label, args in profiles:
+            ok = print_import_profile(label, args) and ok
+    return ok or not check
+
+def print_import_profile(label, args):
+    module = args[0]
+    import_profile(*args)  # lần đầu để nạp file vào bộ nhớ đệm của hệ điều hành
+    runs = [import_profile(*args) for _ in range(3)]
+    if isinstance(runs[0], str):
+        print(f"{label:<26} not importable here: {runs[0]}")
+        return True
+    cumulative, count, gui, _ = min(runs, key=lambda run: run[0])
+    peaks = [run[3] for run in runs if run[3]]
+    peak = f"{min(peaks) / 1024:.1f}" if peaks else "n/a"
+    print(f"{label:<26} {cumulative / 1000:>10.1f} {count:>8} {peak:>8}  {', '.join(gui) or '-'}")
+    if module in HEADLESS_MODULES and gui:
+        print(f"{module} must not import {', '.join(gui)}")
+        return False
+    return True
+
+TOGGLES = 200
+
+def bench_toggle(check=False):
+    """
+    Bật/tắt TOGGLES lần qua VietPyTelexApp.set_telex_state (Qt offscreen, không gắn hook, cấu hình ghi vào
+    thư mục tạm): µs mỗi lần và số file được mở trên luồng GUI trong lúc bật/tắt (phải bằng 0).
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt6.QtWidgets import QApplication
+        import vietpy_telex_gui as gui
+    except ImportError as e:
+        print(f"Skipped: {e}")
+        return True
+    app = QApplication.instance() or QApplication([])
+    gui_thread = threading.get_ident()
+    opened = []
+    counting = False
+
+    def audit(event, args):
+        if counting and event == "open" and threading.get_ident() == gui_thread:
+            opened.append(args[0])
+
+    sys.addaudithook(audit)
+    with tempfile.TemporaryDirectory() as directory:
+        gui.config.path = os.path.join(directory, "config.json")
+        window = gui.VietPyTelexApp(install_hooks=False)
+        timings = []
+        counting = True
+        for _ in range(TOGGLES):
+            started = time.perf_counter_ns()
+            window.set_telex_state(not window.telex_enabled)
+            timings.append(time.perf_counter_ns() - started)
+        counting = False
+        window.session.close()
+        gui.config.flush()
+    timings.sort()
+    print(f"{TOGGLES} toggles: p50 {timings[len(timings) // 2] / 1000:.0f} µs, max {timings[-1] / 1000:.0f} µs, "
+          f"{len(opened)} files opened on the GUI thread")
+    if check and opened:
+        print(f"Toggle path opened files: {', '.join(sorted(set(map(str, opened))))}")
+        return False
+    return True
+
+BENCHMARKS = {
+    "adversarial": bench_adversarial,
+    "emission": bench_emission,
+    "startup": bench_startup,
+    "toggle": bench_toggle,
+}
+
+def main():
+    check = "--check" in sys.argv[1:]
+    baseline = sys.argv[sys.argv.index("--baseline") + 1] if "--baseline" in sys.argv[1:-1] else None
+    selected = [name for name in sys.argv[1:] if name in BENCHMARKS] or list(BENCHMARKS)
+    ok = True
+    for name in selected:
+        print(f"== {name} ==")
+        ok = (bench_startup(check, baseline) if name == "startup" else BENCHMARKS[name](check)) and ok
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
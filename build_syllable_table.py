@@ -0,0 +1,108 @@
+# --- build_syllable_table.py ---
+# Sinh bảng âm tiết dựng sẵn (syllables.bin) cho VietPy Telex.
+# Run: python build_syllable_table.py [đường_dẫn_đầu_ra]
+
+import sys
+
+import vietpy_telex_core as telex
+
+# Phím Telex để gõ từng chữ cái có mũ/móc
+TELEX_KEYS = {'đ': 'dd', 'â': 'aa', 'ê': 'ee', 'ô': 'oo', 'ă': 'aw', 'ơ': 'ow', 'ư': 'uw'}
+
+def iter_syllables():
+    """Sinh (âm tiết, phụ âm đầu, vần, phím dấu thanh) cho mọi âm tiết hợp lệ."""
+    for onset in telex.VALID_ONSETS:
+        for rhyme in telex.VALID_RHYMES:
+            if not telex.is_valid_syllable_part(onset, rhyme):
+                continue
+            tones = telex.ACCENT_MARKS
+            syllable = telex.syllable_spelling(onset, rhyme)
+            if rhyme.endswith(telex.STOP_CODAS):
+                tones = ['s', 'j']
+            else:
+                yield syllable, onset, rhyme, ''
+            for tone in tones:
+                yield syllable, onset, rhyme, tone
+
+def key_sequences(syllable, rhyme, tone):
+    """Các chuỗi phím Telex cho một âm tiết: dấu thanh gõ cuối từ hoặc ngay sau nguyên âm."""
+    keys = ''.join(TELEX_KEYS.get(ch, ch) for ch in syllable)
+    sequences = [keys + tone]
+    coda = rhyme.lstrip(telex.VOWELS_WITH_HAT_OR_HOOK + telex.VOWELS_PLAIN)
+    if tone and coda:
+        sequences.append(keys[:len(keys) - len(coda)] + tone + coda)
+    return sequences
+
+def collect_transitions():
+    """Chạy bộ quy tắc trên từng chuỗi phím, ghi lại kết quả sau mỗi lần nhấn phím."""
+    transitions = {}
+    syllable_count = 0
+    mismatched = []
+    for syllable, onset, rhyme, tone in iter_syllables():
+        syllable_count += 1
+        expected = syllable
+        if tone:
+            pos = telex.find_main_vowel_position(syllable)
+            expected = syllable[:pos] + telex.CHAR_MAP[syllable[pos]][tone] + syllable[pos + 1:]
+        for keys in key_sequences(syllable, rhyme, tone):
+            word = ""
+            for key in keys:
+                typed_word = word + key
+                if typed_word not in transitions:
+                    transitions[typed_word] = telex.apply_word_telex(typed_word)
+                result = transitions[typed_word]
+                word = result if result and result != typed_word else typed_word
+            if word != expected:
+                mismatched.append((keys, word, expected))
+    return transitions, syllable_count, mismatched
+
+def write_syllable_table(path, transitions):
+    strings = bytearray()
+    string_offsets = {}
+
+    def intern(text):
+        if text not in string_offsets:
+            data = text.encode('utf-8')
+            string_offsets[text] = len(strings)
+            strings.append(len(data))
+            strings.extend(data)
+        return string_offsets[text]
+
+    slot_count = 1
+    while slot_count < 2 * len(transitions):  # hệ số tải <= 0.5
+        slot_count *= 2
+    mask = slot_count - 1
+    slots = [(telex.SYLLABLE_TABLE_EMPTY, telex.SYLLABLE_TABLE_EMPTY)] * slot_count
+    for typed_word in sorted(transitions):
+        result = transitions[typed_word]
+        value_offset = telex.SYLLABLE_TABLE_NONE
+        if result and result != typed_word:
+            value_offset = intern(result)
+        slot = telex.syllable_table_slot(typed_word.encode('utf-8'), mask)
+        while slots[slot][0] != telex.SYLLABLE_TABLE_EMPTY:
+            slot = (slot + 1) & mask
+        slots[slot] = (intern(typed_word), value_offset)
+
+    strings_offset = telex.SYLLABLE_TABLE_HEADER.size + slot_count * telex.SYLLABLE_TABLE_SLOT.size
+    with open(path, 'wb') as f:
+        f.write(telex.SYLLABLE_TABLE_HEADER.pack(
+            telex.SYLLABLE_TABLE_MAGIC, telex.SYLLABLE_TABLE_FORMAT, 0, telex.telex_tables_hash(),
+            slot_count, len(transitions), strings_offset))
+        for key_offset, value_offset in slots:
+            f.write(telex.SYLLABLE_TABLE_SLOT.pack(key_offset, value_offset))
+        f.write(strings)
+    return strings_offset + len(strings)
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else telex.SYLLABLE_TABLE_FILE
+    transitions, syllable_count, mismatched = collect_transitions()
+    size = write_syllable_table(path, transitions)
+    print(f"{syllable_count} syllables, {len(transitions)} transitions, {size} bytes -> {path}")
+    print(f"Table hash: {telex.telex_tables_hash().hex()}")
+    if mismatched:
+        print(f"{len(mismatched)} key sequences do not produce the expected syllable, e.g.:")
+        for keys, word, expected in mismatched[:10]:
+            print(f"  {keys} -> {word} (expected {expected})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# --- replay_telex.py ---
+# Phát lại file ghi phím (cấu hình "keystroke_log") qua TelexSession với bàn phím giả, không cần màn hình.
+# Run: python replay_telex.py LOG [--realtime] [--cache-size N] [--expect TEXT]
+#      python replay_telex.py --synthesize LOG "Vieetj Nam" [--interval MS]
+
+import sys
+import time
+import threading
+
+import vietpy_telex_core as telex
+
+class Screen:
+    """Ô nhập liệu giả: nhận phím thật từ file ghi và phím do bộ gõ gửi ra, theo đúng thứ tự tới."""
+    TEXT_KEYS = {'space': ' ', 'enter': '\n', 'tab': '\t'}
+
+    def __init__(self):
+        self.chars = []
+        self.lock = threading.Lock()
+
+    def type_key(self, name):
+        if name == 'backspace':
+            if self.chars: self.chars.pop()
+        elif name in self.TEXT_KEYS:
+            self.chars.append(self.TEXT_KEYS[name])
+        elif len(name) == 1:
+            self.chars.append(name)
+
+    @property
+    def text(self):
+        return ''.join(self.chars)
+
+class ScreenEmitter(telex.RecordingEmitter):
+    """RecordingEmitter đồng thời áp dụng phím gửi ra lên Screen."""
+    name = "screen"
+
+    def __init__(self, screen):
+        super().__init__()
+        self.screen = screen
+
+    def emit(self, backspaces, text):
+        super().emit(backspaces, text)
+        with self.screen.lock:
+            del self.screen.chars[max(0, len(self.screen.chars) - backspaces):]
+            self.screen.chars.extend(text)
+
+class ReplayEvent:
+    __slots__ = ('event_type', 'name')
+
+    def __init__(self, event_type, name):
+        self.event_type = event_type
+        self.name = name
+
+def replay(events, realtime=False, cache_size=0):
+    """Đưa các sự kiện vào TelexSession (không gắn hook hệ thống); trả về (chữ trên màn hình, phiên)."""
+    screen = Screen()
+    session = telex.TelexSession("recording", install_hook=False, cache_size=cache_size)
+    session.emitter = ScreenEmitter(screen)
+    session.set_enabled(True)
+    for delta_us, event_type, name in events:
+        if realtime and delta_us:
+            time.sleep(delta_us / 1e6)
+        # Giữ khóa để phím thật tới ô nhập liệu trước khi luồng xử lý kịp gửi phím thay thế
+        with screen.lock:
+            session.on_key_event(ReplayEvent(event_type, name))
+            if event_type == telex.KEY_DOWN and not session.tracker.chord:
+                screen.type_key(name)
+    session.close(timeout=60)
+    return screen.text, session
+
+def synthesize(path, text, interval_ms=80):
+    """Tạo file ghi phím từ một chuỗi Telex (chữ hoa gõ kèm Shift), mỗi phím cách nhau interval_ms."""
+    names = {' ': 'space', '\n': 'enter', '\t': 'tab'}
+    interval_us = int(interval_ms * 1000)
+    records = []
+    for ch in text:
+        name = names.get(ch, ch)
+        if ch.isupper():
+            records.append((interval_us, 0, 'shift'))
+        records.append((interval_us if not ch.isupper() else 0, 0, name))
+        records.append((interval_us // 2, telex.KEYSTROKE_LOG_KEY_UP, name))
+        if ch.isupper():
+            records.append((0, telex.KEYSTROKE_LOG_KEY_UP, 'shift'))
+    with open(path, 'wb') as f:
+        f.write(telex.KEYSTROKE_LOG_HEADER.pack(telex.KEYSTROKE_LOG_MAGIC, telex.KEYSTROKE_LOG_VERSION, 0, time.time_ns()))
+        for delta_us, flags, name in records:
+            data = name.encode('utf-8')
+            f.write(telex.KEYSTROKE_LOG_RECORD.pack(delta_us, flags, len(data)) + data)
+    return len(records)
+
+def option(args, name, default=None):
+    if name in args:
+        i = args.index(name)
+        value = args[i + 1]
+        del args[i:i + 2]
+        return value
+    return default
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == '--synthesize':
+        interval_ms = float(option(args, '--interval', 80))
+        count = synthesize(args[1], args[2], interval_ms)
+        print(f"{count} events -> {args[1]}")
+        return
+    realtime = '--realtime' in args
+    if realtime: args.remove('--realtime')
+    expected = option(args, '--expect')
+    cache_size = int(option(args, '--cache-size', 0))
+    if not args:
+        print("Usage: python replay_telex.py LOG [--realtime] [--cache-size N] [--expect TEXT]")
+        sys.exit(2)
+    _, events = telex.read_keystroke_log(args[0])
+    started = time.perf_counter()
+    text, session = replay(events, realtime, cache_size)
+    elapsed = time.perf_counter() - started
+    stats = session.stats()
+    metrics = session.metrics
+    print(f"Output: {text!r}")
+    print(f"{len(events)} events in {elapsed:.3f}s, {stats['batches']} batches, "
+          f"{len(session.emitter.events)} emitted events in {session.emitter.calls} emit calls")
+    print(metrics.summary())
+    if expected is not None and text != expected:
+        print(f"Expected: {expected!r}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+# --- test_telex_core.py ---
+# Kiểm tra lõi bộ gõ (vietpy_telex_core.py), chỉ cần thư viện chuẩn, không cần bàn phím hay màn hình.
+# Run: python -m unittest test_telex_core   (hoặc python -m pytest)
+
+import os
+import sys
+import json
+import time
+import tempfile
+import unittest
+import subprocess
+from unittest import mock
+
+import vietpy_telex_core as telex
+import vietpy_telex as tk_app
+import build_syllable_table as build
+from replay_telex import ReplayEvent, Screen, ScreenEmitter
+from vietpy_telex_config import ConfigStore
+
+def type_word(keys):
+    """Gõ một từ qua SyllableState (có kiểm tra tiền tố âm tiết); trả về (chữ, từ đã "chết" chưa)."""
+    syllable = telex.SyllableState()
+    for key in keys:
+        syllable.push(key)
+    return syllable.word, syllable.dead
+
+def baseline_word(keys):
+    """Bộ gõ gốc: chạy lại apply_word_telex trên cả từ sau mỗi phím, không có trie."""
+    word = ""
+    for key in keys:
+        typed_word = word + key
+        result = telex.apply_word_telex(typed_word)
+        word = result if result and result != typed_word else typed_word
+    return word
+
+def list_tone_position(word):
+    """Cách đặt dấu cũ: duyệt tuần tự VOWEL_CLUSTERS_ACCENT_PRIORITY (dùng làm chuẩn đối chiếu)."""
+    word_lower = word.lower()
+    for i in range(len(word_lower) - 1, -1, -1):
+        if word_lower[i] in telex.VOWELS_WITH_HAT_OR_HOOK:
+            return i
+    for cluster, default_relative_pos in telex.VOWEL_CLUSTERS_ACCENT_PRIORITY:
+        pos = word_lower.rfind(cluster)
+        if pos == -1:
+            continue
+        if default_relative_pos == -1:
+            for i in range(pos + len(cluster), len(word_lower)):
+                if word_lower[i] in telex.VOWELS_WITH_HAT_OR_HOOK + telex.VOWELS_PLAIN:
+                    sub_pos = list_tone_position(word_lower[i:])
+                    return i + sub_pos if sub_pos != -1 else i
+            continue
+        is_closed_syllable = (pos + len(cluster) < len(word_lower)) and \
+                             (word_lower[pos + len(cluster)] not in telex.VOWELS_PLAIN)
+        if len(cluster) == 2 and is_closed_syllable:
+            return pos + 1
+        return pos + default_relative_pos
+    for i in range(len(word_lower) - 1, -1, -1):
+        if word_lower[i] in telex.VOWELS_PLAIN:
+            return i
+    return -1
+
+class EchoEmitter(ScreenEmitter):
+    """
+    Bộ gửi giả: ghi sổ như KeyboardEmitter, áp dụng phím lên Screen rồi đưa các phím hệ điều hành sẽ
+    báo lại vào callback của hook, như keyboard.write thật: phím xóa luôn quay lại; ký tự ASCII chỉ quay lại khi echoes_text
+    (ngoài Windows), chữ có dấu thì không.
+    """
+    name = "echo"
+    KEY_NAMES = {' ': 'space', '\n': 'enter', '\t': 'tab'}
+
+    def __init__(self, screen, session, echoes_text):
+        super().__init__(screen)
+        self.session = session
+        self.echoes_text = echoes_text
+
+    def emit(self, backspaces, text):
+        self.session.ledger.expect('\b' * backspaces)
+        self.session.ledger.expect(text)
+        super().emit(backspaces, text)
+        echoes = ['backspace'] * backspaces
+        if self.echoes_text:
+            echoes += [self.KEY_NAMES.get(ch, ch.lower()) for ch in text if ch.isascii()]
+        for name in echoes:
+            self.session.on_key_event(ReplayEvent(telex.KEY_DOWN, name))
+            self.session.on_key_event(ReplayEvent(telex.KEY_UP, name))
+
+class EchoSession:
+    """Phiên không gắn hook, luồng xử lý chạy ngay trên luồng kiểm thử để biết chắc phím nào chung một loạt."""
+
+    def __init__(self, echoes_text, session_class=telex.TelexSession):
+        self.screen = Screen()
+        self.session = session_class("recording", install_hook=False)
+        self.session.ledger.echoes_text = echoes_text
+        self.session.emitter = EchoEmitter(self.screen, self.session, echoes_text)
+        self.session._post(self.session.MSG_ENABLE, True)
+
+    def type(self, text):
+        """Gõ các phím thật (tới ô nhập liệu ngay, như khi hook không chặn), chưa xử lý."""
+        for ch in text:
+            name = EchoEmitter.KEY_NAMES.get(ch, ch)
+            self.session.on_key_event(ReplayEvent(telex.KEY_DOWN, name))
+            self.screen.type_key(name)
+            self.session.on_key_event(ReplayEvent(telex.KEY_UP, name))
+
+    def press(self, *names):
+        """Nhấn giữ các phím theo thứ tự rồi nhả theo thứ tự ngược lại (tổ hợp phím), không gõ gì ra ô nhập liệu."""
+        for name in names:
+            self.session.on_key_event(ReplayEvent(telex.KEY_DOWN, name))
+        for name in reversed(names):
+            self.session.on_key_event(ReplayEvent(telex.KEY_UP, name))
+
+    def drain(self):
+        """Xử lý mọi thông điệp đang chờ như một lần luồng xử lý thức dậy."""
+        self.session._post(self.session.MSG_STOP)
+        self.session._run()
+
+    def type_each(self, text):
+        for ch in text:
+            self.type(ch)
+            self.drain()
+        self.drain()  # phím quay lại mà sổ không nhận ra sẽ bị xử lý như phím thật ở đây
+        return self.screen.text
+
+class InjectionEchoTest(unittest.TestCase):
+    def test_echo_names_match_hook_names(self):
+        ledger = telex.InjectionLedger(echoes_text=True)
+        self.assertEqual([ledger.echo_name(ch) for ch in "\b\n\t a"],
+                         ['backspace', 'enter', 'tab', 'space', 'a'])
+        self.assertIsNone(ledger.echo_name('ệ'))
+        ledger = telex.InjectionLedger(echoes_text=False)
+        self.assertEqual([ledger.echo_name(ch) for ch in "\b\n\t a"], ['backspace', 'enter', None, None, None])
+
+    def test_space_is_matched_by_its_key_name(self):
+        ledger = telex.InjectionLedger(echoes_text=True)
+        ledger.expect("t nam")
+        for name in ('t', 'space', 'n', 'a', 'm'):
+            self.assertTrue(ledger.match(name), name)
+        self.assertEqual(ledger.stats()["pending"], 0)
+
+    def test_unechoed_text_does_not_swallow_real_keys(self):
+        ledger = telex.InjectionLedger(echoes_text=False)
+        ledger.expect("\b\bọc")
+        self.assertTrue(ledger.match('backspace'))
+        self.assertTrue(ledger.match('backspace'))
+        self.assertFalse(ledger.match('c'))
+
+    def test_echoes_key_by_key(self):
+        for echoes_text in (True, False):
+            with self.subTest(echoes_text=echoes_text):
+                run = EchoSession(echoes_text)
+                self.assertEqual(run.type_each("tooi ddi hocj cas vieetj nam"), "tôi đi học cá việt nam")
+                self.assertEqual(run.session.depth, 0)
+                self.assertEqual(run.session.ledger.stats()["pending"], 0)
+
+    def test_burst_across_word_break(self):
+        # Cả cụm phím tới cùng một loạt: một lần gửi ròng xóa qua dấu cách và gõ lại cả từ sau
+        for echoes_text in (True, False):
+            with self.subTest(echoes_text=echoes_text):
+                run = EchoSession(echoes_text)
+                run.type("tooi ddi hocj vieetj nam")
+                run.drain()
+                self.assertEqual(run.session.stats()["batches"], 1)
+                self.assertEqual(run.type_each(" nhes"), "tôi đi học việt nam nhé")
+                self.assertEqual(run.session.depth, 0)
+                self.assertEqual(run.session.ledger.stats()["pending"], 0)
+
+class ModifierTrackerTest(unittest.TestCase):
+    def feed(self, tracker, events):
+        return [tracker.feed(event_type, name) for event_type, name in events]
+
+    def test_autorepeat_is_reported_until_release(self):
+        tracker = telex.ModifierTracker()
+        down, up = telex.KEY_DOWN, telex.KEY_UP
+        self.assertEqual(self.feed(tracker, [(down, 'a'), (down, 'a'), (down, 'A'), (up, 'a'), (down, 'a')]),
+                         [tracker.KEY, tracker.REPEAT, tracker.REPEAT, tracker.IGNORE, tracker.KEY])
+
+    def test_ctrl_alt_windows_chords_reset(self):
+        down, up = telex.KEY_DOWN, telex.KEY_UP
+        for modifier in ('ctrl', 'left ctrl', 'right ctrl', 'alt', 'right alt', 'windows', 'left windows', 'command'):
+            with self.subTest(modifier=modifier):
+                tracker = telex.ModifierTracker()
+                self.assertEqual(self.feed(tracker, [(down, modifier), (down, 'c'), (up, 'c'), (up, modifier), (down, 'c')]),
+                                 [tracker.IGNORE, tracker.RESET, tracker.IGNORE, tracker.IGNORE, tracker.KEY])
+        for modifier in ('shift', 'right shift', 'alt gr'):
+            with self.subTest(modifier=modifier):
+                tracker = telex.ModifierTracker()
+                self.assertEqual(self.feed(tracker, [(down, modifier), (down, 'c')]), [tracker.IGNORE, tracker.KEY])
+
+    def test_chord_lasts_while_either_side_is_held(self):
+        tracker = telex.ModifierTracker()
+        down, up = telex.KEY_DOWN, telex.KEY_UP
+        self.feed(tracker, [(down, 'left ctrl'), (down, 'right ctrl'), (up, 'left ctrl')])
+        self.assertTrue(tracker.chord)
+        self.assertEqual(tracker.feed(down, 'x'), tracker.RESET)
+        tracker.feed(up, 'right ctrl')
+        self.assertFalse(tracker.chord)
+        self.assertEqual(tracker.feed(down, 'x'), tracker.KEY)
+
+    def test_lock_keys_are_ignored(self):
+        tracker = telex.ModifierTracker()
+        down, up = telex.KEY_DOWN, telex.KEY_UP
+        for name in tracker.LOCKS:
+            self.assertEqual(self.feed(tracker, [(down, name), (down, name), (up, name)]), [tracker.IGNORE] * 3)
+
+    def test_other_keys(self):
+        tracker = telex.ModifierTracker()
+        down, up = telex.KEY_DOWN, telex.KEY_UP
+        self.assertEqual(self.feed(tracker, [(down, 'backspace'), (down, 'space'), (down, 'enter'), (down, 'esc'),
+                                             (down, 'left'), (down, None), (up, None), (up, 'enter')]),
+                         [tracker.KEY, tracker.KEY] + [tracker.RESET] * 4 + [tracker.IGNORE] * 2)
+
+    def test_session_breaks_words_on_chords_only(self):
+        run = EchoSession(echoes_text=False)
+        run.type_each("tooi")
+        run.press('caps lock')
+        run.press('shift')
+        self.assertEqual(run.type_each("s"), "tối")
+        run = EchoSession(echoes_text=False)
+        run.type_each("tooi")
+        run.press('ctrl', 'left')
+        self.assertEqual(run.type_each("s"), "tôis")
+
+MS = 1_000_000
+S = 1_000_000_000
+
+class LatencyWatchdogTest(unittest.TestCase):
+    def slow(self, watchdog, finished, elapsed=6 * MS):
+        return watchdog.check(finished - elapsed, finished, [('a', False)], "a")
+
+    def test_trips_on_the_last_strike_in_the_window(self):
+        watchdog = telex.LatencyWatchdog(budget_ms=5, strikes=3, window_s=10, cooldown_s=30)
+        self.assertIsNone(self.slow(watchdog, 1 * S, elapsed=5 * MS))  # đúng bằng ngân sách: không tính
+        self.assertEqual(watchdog.breaches, 0)
+        self.assertIsNone(self.slow(watchdog, 1 * S))
+        self.assertIsNone(self.slow(watchdog, 2 * S))
+        incident = self.slow(watchdog, 3 * S)
+        self.assertIsNotNone(incident)
+        self.assertEqual((incident["keys"], incident["word"], incident["cooldown_s"]), ("a", "a", 30))
+        self.assertEqual(watchdog.breaches, 3)
+        self.assertEqual(list(watchdog.incidents), [incident])
+
+    def test_strikes_outside_the_window_expire(self):
+        watchdog = telex.LatencyWatchdog(budget_ms=5, strikes=3, window_s=10, cooldown_s=30)
+        self.assertIsNone(self.slow(watchdog, 1 * S))
+        self.assertIsNone(self.slow(watchdog, 6 * S))
+        self.assertIsNotNone(self.slow(watchdog, 11 * S))  # lần đầu cách đúng bằng cửa sổ: vẫn tính
+        watchdog = telex.LatencyWatchdog(budget_ms=5, strikes=3, window_s=10, cooldown_s=30)
+        self.assertIsNone(self.slow(watchdog, 1 * S))
+        self.assertIsNone(self.slow(watchdog, 11 * S + 1))  # lần đầu đã ra khỏi cửa sổ
+        self.assertIsNone(self.slow(watchdog, 11 * S + 2))
+        self.assertIsNotNone(self.slow(watchdog, 11 * S + 3))
+
+    def test_cooldown_then_rearms_with_fresh_strikes(self):
+        watchdog = telex.LatencyWatchdog(budget_ms=5, strikes=2, window_s=10, cooldown_s=30)
+        self.slow(watchdog, 1 * S)
+        self.assertIsNotNone(self.slow(watchdog, 2 * S))
+        self.assertTrue(watchdog.active(2 * S))
+        self.assertTrue(watchdog.active(32 * S - 1))
+        self.assertFalse(watchdog.active(32 * S))
+        self.assertIsNone(self.slow(watchdog, 32 * S))  # các lần vượt trước sự cố không được tính lại
+        self.assertIsNotNone(self.slow(watchdog, 33 * S))
+        self.assertTrue(watchdog.active(33 * S))
+
+    def test_session_passes_keys_through_then_resumes_at_word_break(self):
+        run = EchoSession(echoes_text=False)
+        run.session.watchdog.passthrough_until = time.perf_counter_ns() + 60 * S
+        run.type_each("tooi")
+        run.session.watchdog.passthrough_until = 0
+        self.assertEqual(run.type_each("s vieetj"), "toois việt")  # từ gõ dở lúc cho qua được để nguyên
+
+class KeystrokeRecorderTest(unittest.TestCase):
+    def test_records_only_real_keys(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "keys.vpkl")
+            for echoes_text in (True, False):
+                with self.subTest(echoes_text=echoes_text):
+                    run = EchoSession(echoes_text)
+                    run.session.recorder = telex.KeystrokeRecorder(path)
+                    self.assertEqual(run.type_each("hocj nhes"), "học nhé")
+                    run.session.close()
+                    _, events = telex.read_keystroke_log(path)
+                    names = [EchoEmitter.KEY_NAMES.get(ch, ch) for ch in "hocj nhes"]
+                    self.assertEqual([(event_type, name) for _, event_type, name in events],
+                                     [(event_type, name) for name in names for event_type in (telex.KEY_DOWN, telex.KEY_UP)])
+
+class ToneIndexTest(unittest.TestCase):
+    def test_rhyme_tone_index_matches_list_based_rules(self):
+        # RHYME_TONE_INDEX/automat so với cách duyệt danh sách cũ trên mọi buffer của bảng âm tiết
+        transitions, _, _ = build.collect_transitions()
+        words = set()
+        for typed_word, result in transitions.items():
+            words.add(typed_word[:-1])
+            if result:
+                words.add(result)
+        for nucleus, has_coda in telex.RHYME_TONE_INDEX:
+            for onset in telex.VALID_ONSETS:
+                words.add(onset + nucleus + ('ng' if has_coda else ''))
+        wrong = [(word, telex.find_main_vowel_position(word), list_tone_position(word))
+                 for word in sorted(words) if telex.find_main_vowel_position(word) != list_tone_position(word)]
+        self.assertEqual(wrong, [])
+
+class SyllablePrefixTrieTest(unittest.TestCase):
+    WORDS = {
+        "quynhf": "quỳnh", "quyts": "quýt", "quytj": "quỵt", "quychs": "quých", "ginf": "gìn", "gif": "gì",
+        "giuwx": "giữ", "gieengs": "giếng", "giowf": "giờ", "quoocs": "quốc", "quyeenf": "quyền",
+        "quyeets": "quyết", "nghieeng": "nghiêng", "khuyur": "khuỷu", "tuyeets": "tuyết", "nguwowif": "người",
+        "thuowngr": "thưởng", "dduwowngf": "đường", "Vieetj": "Việt", "chaau": "châu", "khoer": "khỏe",
+    }
+
+    def test_words_stay_live(self):
+        for keys, expected in self.WORDS.items():
+            with self.subTest(keys=keys):
+                self.assertEqual(type_word(keys), (expected, False))
+
+    def test_every_syllable_the_baseline_produces_stays_live(self):
+        # Mọi âm tiết sinh bảng mà bộ gõ gốc gõ ra đúng phải vẫn sống trong trie và cho cùng kết quả
+        wrong = []
+        for syllable, onset, rhyme, tone in build.iter_syllables():
+            expected = syllable
+            if tone:
+                pos = telex.find_main_vowel_position(syllable)
+                expected = syllable[:pos] + telex.CHAR_MAP[syllable[pos]][tone] + syllable[pos + 1:]
+            for keys in build.key_sequences(syllable, rhyme, tone):
+                if baseline_word(keys) == expected and type_word(keys) != (expected, False):
+                    wrong.append((keys, expected, type_word(keys)))
+        self.assertEqual(wrong, [])
+
+    def test_non_words_are_dead(self):
+        for keys in ("thw", "cie", "quu", "ngia", "kas"):
+            with self.subTest(keys=keys):
+                self.assertTrue(type_word(keys)[1])
+
+class TelexSessionTest(unittest.TestCase):
+    def test_sessions_do_not_share_cache(self):
+        first = telex.TelexSession("recording", install_hook=False, cache_size=16)
+        second = telex.TelexSession("recording", install_hook=False, cache_size=16)
+        self.assertIsNot(first.cache, second.cache)
+        for key in "vieetj":
+            first.process_key(key)
+        self.assertGreater(first.cache.stats()["size"], 0)
+        self.assertEqual(second.cache.stats()["size"], 0)
+        self.assertEqual(first.metrics.to_dict()["cache"]["misses"], first.cache.misses)
+        self.assertIn("Bộ nhớ đệm: trúng", first.metrics.summary())
+
+    def test_word_breaks_are_not_counted_as_keys(self):
+        run = EchoSession(echoes_text=False)
+        run.type("tooi")
+        run.press('ctrl', 'left')
+        run.type("s")
+        run.press('esc')
+        run.drain()
+        self.assertEqual(run.session.stats()["batches"], 1)
+        self.assertEqual(run.session.metrics.keys, 5)
+        self.assertEqual(run.session.metrics.end_to_end.count, 5)
+
+    def test_toggle_latency_is_reported_once_recorded(self):
+        metrics = telex.TelexMetrics()
+        self.assertNotIn("toggle:", metrics.summary())
+        metrics.toggle.record(2_000_000)
+        self.assertIn("toggle:", metrics.summary())
+        self.assertEqual(metrics.to_dict()["toggle"]["count"], 1)
+
+class ConfigStoreTest(unittest.TestCase):
+    DEFAULTS = {"enabled": False, "theme": "light"}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "config.json")
+
+    def read(self):
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def wait_for_writes(self, store, writes, timeout_s=5):
+        deadline = time.monotonic() + timeout_s
+        while store.writes < writes and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_saves_within_the_delay_become_one_write(self):
+        store = ConfigStore(self.path, self.DEFAULTS, delay_s=0.2)
+        for theme in ("dark", "light", "dark"):
+            store["theme"] = theme
+            store.save()
+        store["enabled"] = True
+        store.save()
+        self.assertFalse(os.path.exists(self.path))  # save() chỉ lên lịch, không ghi trên luồng gọi
+        self.wait_for_writes(store, 1)
+        time.sleep(0.3)  # không có lần ghi thứ hai
+        self.assertEqual(store.writes, 1)
+        self.assertEqual(self.read(), {"enabled": True, "theme": "dark"})
+        store["theme"] = "dark"  # không đổi gì: không ghi
+        store.save()
+        self.assertTrue(store.flush())
+        self.assertEqual(store.writes, 1)
+
+    def test_interrupted_write_keeps_the_old_file(self):
+        store = ConfigStore(self.path, self.DEFAULTS)
+        store["theme"] = "dark"
+        self.assertTrue(store.flush())
+        store["enabled"] = True
+        with mock.patch("os.fsync", side_effect=OSError("disk full")):
+            self.assertFalse(store.flush())
+        self.assertEqual(self.read(), {"enabled": False, "theme": "dark"})
+        self.assertEqual(os.listdir(self.directory), ["config.json"])  # không còn file tạm
+        self.assertTrue(store.dirty)
+        self.assertTrue(store.flush())  # thay đổi được giữ để ghi lại
+        self.assertEqual(self.read(), {"enabled": True, "theme": "dark"})
+
+    def test_pending_change_is_written_at_exit(self):
+        code = (f"from vietpy_telex_config import ConfigStore\n"
+                f"store = ConfigStore({self.path!r}, {self.DEFAULTS!r}, delay_s=60)\n"
+                f"store['theme'] = 'dark'\n"
+                f"store.save()\n")
+        subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        self.assertEqual(self.read(), {"enabled": False, "theme": "dark"})
+
+class TkSessionTest(unittest.TestCase):
+    def test_core_session_runs_the_tk_word_rules(self):
+        for echoes_text in (True, False):
+            with self.subTest(echoes_text=echoes_text):
+                run = EchoSession(echoes_text, tk_app.TkTelexSession)
+                # Bản Tk đặt dấu "hoaf", "thuys" thành hoà, thúy; lõi thành hòa, thuý
+                self.assertEqual(run.type_each("tooi ddi hoaf thuys"), "tôi đi hoà thúy")
+                self.assertEqual(run.session.ledger.stats()["pending"], 0)
+        self.assertEqual((type_word("hoaf")[0], type_word("thuys")[0]), ("hòa", "thuý"))
+
+    def test_cache_belongs_to_the_session(self):
+        session = tk_app.TkTelexSession("recording", install_hook=False, cache_size=8)
+        for key in "hoaf":
+            session.process_key(key)
+        self.assertEqual(session.syllable.word, "hoà")
+        self.assertIs(session.syllable.cache, session.cache)
+        self.assertGreater(session.cache.stats()["misses"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,12 @@
-import tkinter as tk
-from tkinter import messagebox, ttk
-import keyboard
 import threading
 import platform
 import sys
 import os
-import json
-from pystray import Icon as PyTrayIcon, MenuItem as PyTrayMenuItem
-from PIL import Image, ImageTk # pip install Pillow
+from vietpy_telex_instance import SingleInstance, command_from_argv
+from vietpy_telex_config import ConfigStore
+from vietpy_telex_core import (HAT_CIRCUMFLEX, HAT_HOOK, MAX_SYLLABLE_LENGTH, TONE_INDEX, SyllableState, TelexCache,
+                               TelexSession, compose_hat, compose_tone, strip_tone_or_hat)
+# tkinter, keyboard, pystray và PIL chỉ được nạp khi dùng tới (cửa sổ, hook, khay hệ thống)
 
 # --- Cấu hình mặc định ---
 if platform.system() == "Windows":
@@ -18,47 +17,29 @@ elif platform.system() == "Darwin": # macOS
 else: # Linux và các OS khác
     CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".config", 'VietPyTelex')
 
-os.makedirs(CONFIG_DIR, exist_ok=True)
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
 
 DEFAULT_CONFIG = {
     "enabled": True,
     "auto_start": False,
+    "telex_cache_size": 0, # Số từ tối đa trong bộ nhớ đệm apply_word_telex (0 = tắt)
 }
 
 # --- Biến toàn cục để quản lý trạng thái ---
-config = DEFAULT_CONFIG.copy()
-is_telex_enabled = False
-keyboard_hook = None
+config = ConfigStore(CONFIG_FILE, DEFAULT_CONFIG)
+telex_session = None  # TkTelexSession, tạo trong main() (KeyboardEmitter nạp keyboard)
+telex_enabled = False  # trạng thái được yêu cầu gần nhất, chỉ luồng Tk ghi (phiên tự giữ trạng thái thật)
 root = None
 status_label = None
 tray_icon = None
 
-current_word_buffer = ""
-
 # --- Hàm tải và lưu cấu hình ---
 def load_config():
-    global config
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                loaded_config = json.load(f)
-                config.update(loaded_config)
-            print("Config loaded successfully.")
-        except json.JSONDecodeError:
-            print("Error decoding config file. Using default config.")
-        except Exception as e:
-            print(f"An error occurred loading config: {e}. Using default config.")
-    else:
-        print("Config file not found. Using default config.")
+    config.load()
 
 def save_config():
-    try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=4)
-        print("Config saved successfully.")
-    except Exception as e:
-        print(f"Error saving config: {e}")
+    # Không chặn luồng Tk: ConfigStore gộp các thay đổi và ghi nguyên tử ở luồng nền
+    config.save()
 
 # --- Logic gõ Telex Đầy Đủ và Tinh chỉnh ---
 
@@ -102,91 +83,114 @@ CHAR_MAP = {
     'uay': {'s': 'uáy', 'f': 'uày', 'r': 'uảy', 'x': 'uãy', 'j': 'uạy'},
 }
 
-# Bảng bỏ dấu từng bước và bỏ dấu mũ/móc
-# Key: Ký tự có dấu
-# Value: (Ký tự sau khi bỏ dấu thanh, Ký tự sau khi bỏ dấu mũ/móc)
-UNACCENT_FULL_MAP = {
-    # Nguyên âm không dấu (dùng để bỏ dấu thanh -> không dấu)
-    'a': (None, None), 'e': (None, None), 'i': (None, None), 'o': (None, None), 'u': (None, None), 'y': (None, None),
-    'd': (None, None), # Cho 'đ'
-
-    # Dấu sắc
-    'á': ('a', None), 'ắ': ('ă', 'a'), 'ấ': ('â', 'a'), 'é': ('e', None), 'ế': ('ê', 'e'), 
-    'í': ('i', None), 'ó': ('o', None), 'ớ': ('ơ', 'o'), 'ố': ('ô', 'o'), 
-    'ú': ('u', None), 'ứ': ('ư', 'u'), 'ý': ('y', None),
-
-    # Dấu huyền
-    'à': ('a', None), 'ằ': ('ă', 'a'), 'ầ': ('â', 'a'), 'è': ('e', None), 'ề': ('ê', 'e'),
-    'ì': ('i', None), 'ò': ('o', None), 'ờ': ('ơ', 'o'), 'ồ': ('ô', 'o'),
-    'ù': ('u', None), 'ừ': ('ư', 'u'), 'ỳ': ('y', None),
-
-    # Dấu hỏi
-    'ả': ('a', None), 'ẳ': ('ă', 'a'), 'ẩ': ('â', 'a'), 'ẻ': ('e', None), 'ể': ('ê', 'e'),
-    'ỉ': ('i', None), 'ỏ': ('o', None), 'ở': ('ơ', 'o'), 'ổ': ('ô', 'o'),
-    'ủ': ('u', None), 'ử': ('ư', 'u'), 'ỷ': ('y', None),
-
-    # Dấu ngã
-    'ã': ('a', None), 'ẵ': ('ă', 'a'), 'ẫ': ('â', 'a'), 'ẽ': ('e', None), 'ễ': ('ê', 'e'),
-    'ĩ': ('i', None), 'õ': ('o', None), 'ỡ': ('ơ', 'o'), 'ỗ': ('ô', 'o'),
-    'ũ': ('u', None), 'ữ': ('ư', 'u'), 'ỹ': ('y', None),
-
-    # Dấu nặng
-    'ạ': ('a', None), 'ặ': ('ă', 'a'), 'ậ': ('â', 'a'), 'ẹ': ('e', None), 'ệ': ('ê', 'e'),
-    'ị': ('i', None), 'ọ': ('o', None), 'ợ': ('ơ', 'o'), 'ộ': ('ô', 'o'),
-    'ụ': ('u', None), 'ự': ('ư', 'u'), 'ỵ': ('y', None),
-
-    # Ký tự có mũ/móc nhưng không có dấu thanh
-    'ă': (None, 'a'), 'â': (None, 'a'), 'ê': (None, 'e'), 'ô': (None, 'o'), 'ơ': (None, 'o'), 'ư': (None, 'u'),
-    'đ': (None, 'd')
-}
-
 ACCENT_MARKS = ['s', 'f', 'r', 'x', 'j']
 SPECIAL_CHAR_RULES = ['w'] # 'w' cho ă, ơ, ư
 
+# Bảng tổ hợp ký tự (compose_tone, compose_hat, strip_tone_or_hat) và TelexCache dùng chung với
+# vietpy_telex_core.py; CHAR_MAP ở trên chỉ còn được dùng cho các quy tắc theo vần.
+
 # Các nguyên âm được sắp xếp theo thứ tự ưu tiên (ưu tiên hơn để đặt dấu)
 VOWELS_PRIORITY = "ăâêôơưaeyiou" 
 
+# Danh sách các vần và vị trí tương đối của dấu (từ 0)
+# Khi nhiều vần cùng kết thúc tại một vị trí, vần đứng trước trong danh sách được chọn
+VOWEL_CLUSTERS_RULES = [
+    ("uyê", 2), ("uya", 2), ("oai", 2), ("uay", 2), # Vần 3 ký tự (dấu trên ký tự thứ 3)
+    
+    ("ươ", 1), ("uô", 1), # Vần 2 ký tự (dấu trên ký tự thứ 2)
+    ("ai", 1), ("ao", 1), ("au", 1), ("ay", 1), 
+    ("eo", 1), ("eu", 1), ("ia", 1), ("ie", 1), 
+    ("iu", 1), ("oe", 1), ("oi", 1), ("ua", 1), 
+    ("ue", 1), ("ui", 1), ("uo", 1), ("uy", 1) # ưu tiên y/i cuối
+]
+
+def build_cluster_automaton(rules):
+    """
+    Biên dịch danh sách vần thành automat Aho-Corasick (chạy một lần khi import).
+    Trả về (bảng chuyển trạng thái, chỉ số quy tắc ưu tiên nhất kết thúc tại mỗi trạng thái).
+    """
+    goto = [{}]
+    best_rule = [-1]
+    for rule_index, (cluster_rule, _) in enumerate(rules):
+        state = 0
+        for ch in cluster_rule:
+            if ch not in goto[state]:
+                goto.append({})
+                best_rule.append(-1)
+                goto[state][ch] = len(goto) - 1
+            state = goto[state][ch]
+        if best_rule[state] == -1:
+            best_rule[state] = rule_index
+
+    alphabet = {ch for cluster_rule, _ in rules for ch in cluster_rule}
+    fail = [0] * len(goto)
+    queue = []
+    for ch in alphabet:
+        if ch in goto[0]:
+            queue.append(goto[0][ch])
+        else:
+            goto[0][ch] = 0
+
+    # Duyệt theo chiều rộng để tính liên kết lỗi và làm đầy bảng chuyển
+    for state in queue:
+        for ch in alphabet:
+            next_state = goto[state].get(ch)
+            if next_state is None:
+                goto[state][ch] = goto[fail[state]][ch]
+                continue
+            fail[next_state] = goto[fail[state]][ch]
+            inherited = best_rule[fail[next_state]]
+            if inherited != -1 and (best_rule[next_state] == -1 or inherited < best_rule[next_state]):
+                best_rule[next_state] = inherited
+            queue.append(next_state)
+    return goto, best_rule
+
+CLUSTER_GOTO, CLUSTER_BEST_RULE = build_cluster_automaton(VOWEL_CLUSTERS_RULES)
+
 # Hàm tìm vị trí nguyên âm chính để đặt dấu
 def find_accent_position(word):
     word_lower = word.lower()
-    
+
+    # Duyệt từ trái sang phải đúng một lần, ghi nhận đồng thời:
+    # - vị trí cuối cùng của nguyên âm có mũ/móc (quy tắc 1)
+    # - vần kết thúc muộn nhất (quy tắc 2)
+    # - vị trí cuối cùng của nguyên âm trong VOWELS_PRIORITY (quy tắc 3)
+    last_hat_pos = -1
+    last_vowel_pos = -1
+    cluster_end = -1
+    cluster_rule_index = -1
+    state = 0
+    for i, ch in enumerate(word_lower):
+        state = CLUSTER_GOTO[state].get(ch, 0)
+        if CLUSTER_BEST_RULE[state] != -1:
+            cluster_end = i
+            cluster_rule_index = CLUSTER_BEST_RULE[state]
+        if ch in "âêôăơư":
+            last_hat_pos = i
+        if ch in VOWELS_PRIORITY:
+            last_vowel_pos = i
+
     # Quy tắc 1: Ưu tiên các nguyên âm có mũ/móc (â, ê, ô, ă, ơ, ư)
-    # Duyệt từ phải sang trái để lấy vị trí cuối cùng nếu có nhiều
-    for i in range(len(word_lower) - 1, -1, -1):
-        if word_lower[i] in "âêôăơư":
-            return i
+    if last_hat_pos != -1:
+        return last_hat_pos
 
     # Quy tắc 2: Xử lý các vần (nguyên âm đôi/ba) và vị trí đặt dấu
-    # Danh sách các vần và vị trí tương đối của dấu (từ 0)
-    # Sắp xếp từ dài nhất đến ngắn nhất để tránh bắt nhầm vần con
-    vowel_clusters_rules = [
-        ("uyê", 2), ("uya", 2), ("oai", 2), ("uay", 2), # Vần 3 ký tự (dấu trên ký tự thứ 3)
-        
-        ("ươ", 1), ("uô", 1), # Vần 2 ký tự (dấu trên ký tự thứ 2)
-        ("ai", 1), ("ao", 1), ("au", 1), ("ay", 1), 
-        ("eo", 1), ("eu", 1), ("ia", 1), ("ie", 1), 
-        ("iu", 1), ("oe", 1), ("oi", 1), ("ua", 1), 
-        ("ue", 1), ("ui", 1), ("uo", 1), ("uy", 1) # ưu tiên y/i cuối
-    ]
-    
-    # Duyệt qua từ từ phải sang trái để tìm vần phù hợp
-    for i in range(len(word_lower) - 1, -1, -1):
-        for cluster_rule, relative_pos in vowel_clusters_rules:
-            cluster_len = len(cluster_rule)
-            if i >= cluster_len - 1: # Đảm bảo có đủ ký tự cho vần
-                sub_word = word_lower[i - (cluster_len - 1) : i + 1]
-                if sub_word == cluster_rule:
-                    return (i - (cluster_len - 1)) + relative_pos
+    if cluster_end != -1:
+        cluster_rule, relative_pos = VOWEL_CLUSTERS_RULES[cluster_rule_index]
+        return (cluster_end - (len(cluster_rule) - 1)) + relative_pos
 
     # Quy tắc 3: Nếu không tìm thấy các trường hợp trên, tìm nguyên âm cuối cùng theo VOWELS_PRIORITY
-    for i in range(len(word_lower) - 1, -1, -1):
-        if word_lower[i] in VOWELS_PRIORITY:
-            return i
-            
-    return -1 # Không tìm thấy nguyên âm
+    return last_vowel_pos # -1 nếu không tìm thấy nguyên âm
 
 def apply_telex_rule_to_char(char_to_convert_or_cluster, rule_char):
     """Áp dụng quy tắc Telex cho một ký tự hoặc một vần."""
+    # Ký tự đơn: tra thẳng bảng tổ hợp
+    if len(char_to_convert_or_cluster) == 1:
+        if rule_char in TONE_INDEX:
+            return compose_tone(char_to_convert_or_cluster, rule_char)
+        if rule_char == 'w':
+            return compose_hat(char_to_convert_or_cluster, HAT_HOOK)
+
     lower_target = char_to_convert_or_cluster.lower()
     
     if lower_target in CHAR_MAP:
@@ -197,27 +201,6 @@ def apply_telex_rule_to_char(char_to_convert_or_cluster, rule_char):
             return result.upper() if char_to_convert_or_cluster[0].isupper() else result
     return None
 
-def unaccent_char_step_by_step(char_with_accent, is_first_z=True):
-    """
-    Bỏ dấu của một ký tự theo từng bước.
-    is_first_z=True: bỏ dấu thanh.
-    is_first_z=False: bỏ dấu mũ/móc.
-    """
-    lower_char = char_with_accent.lower()
-    if lower_char in UNACCENT_FULL_MAP:
-        accent_removed, hat_removed = UNACCENT_FULL_MAP[lower_char]
-        
-        if is_first_z: # Lần nhấn 'z' đầu tiên
-            if accent_removed is not None: # Nếu có dấu thanh để bỏ
-                return accent_removed.upper() if char_with_accent.isupper() else accent_removed
-            elif hat_removed is not None: # Nếu không có dấu thanh nhưng có dấu mũ/móc (vd: 'ă', 'â', 'ê', v.v.)
-                return hat_removed.upper() if char_with_accent.isupper() else hat_removed
-        else: # Lần nhấn 'z' thứ hai
-            if hat_removed is not None: # Ưu tiên bỏ dấu mũ/móc
-                return hat_removed.upper() if char_with_accent.isupper() else hat_removed
-            
-    return char_with_accent # Trả về nguyên nếu không có dấu để bỏ
-
 def apply_word_telex(word_in):
     """
     Áp dụng quy tắc Telex cho một từ.
@@ -232,21 +215,9 @@ def apply_word_telex(word_in):
     if last_char == 'd' and len(word_in) >= 2 and word_in[-2].lower() == 'd':
         return word_in[:-2] + apply_telex_rule_to_char('d', 'd')
 
-    # 2. Xử lý bỏ dấu "z"
+    # 2. Xử lý bỏ dấu "z": mỗi lần nhấn bỏ dấu thanh, ký tự không có dấu thanh thì bỏ mũ/móc
     if last_char == 'z' and len(word_in) >= 2:
-        target_word_base = word_in[:-1] 
-        
-        any_char_has_accent_mark = False
-        for c in target_word_base:
-            if c.lower() in UNACCENT_FULL_MAP and UNACCENT_FULL_MAP[c.lower()][0] is not None:
-                any_char_has_accent_mark = True
-                break
-        
-        unaccented_word_chars = []
-        for c in target_word_base:
-            unaccented_word_chars.append(unaccent_char_step_by_step(c, is_first_z=any_char_has_accent_mark))
-        
-        return "".join(unaccented_word_chars)
+        return "".join(strip_tone_or_hat(c) for c in word_in[:-1])
 
     # 3. Xử lý dấu thanh (s, f, r, x, j) và 'w'
     if last_char in ACCENT_MARKS or last_char == 'w':
@@ -290,101 +261,72 @@ def apply_word_telex(word_in):
     
     # 4. Xử lý chữ cái kép đặc biệt (aa -> â, ee -> ê, oo -> ô)
     if len(word_in) >= 2 and word_in[-1].lower() == word_in[-2].lower() and word_in[-1].lower() in ['a', 'e', 'o']:
-        double_char_rule = word_in[-2:].lower()
-        
-        if double_char_rule[0] in CHAR_MAP and double_char_rule in CHAR_MAP[double_char_rule[0]]:
-            converted_char = CHAR_MAP[double_char_rule[0]][double_char_rule]
-            return word_in[:-2] + (converted_char.upper() if word_in[-2].isupper() else converted_char)
+        converted_char = compose_hat(word_in[-2], HAT_CIRCUMFLEX)
+        if converted_char:
+            return word_in[:-2] + converted_char
 
     return None
 
-# --- Bộ xử lý phím toàn cục ---
-def process_keyboard_event(e):
-    global current_word_buffer
-
-    if not is_telex_enabled:
-        return
-
-    key_name = e.name 
-
-    # Xử lý các phím đặc biệt (ngắt từ)
-    if key_name in ['space', 'enter', 'tab']:
-        if current_word_buffer:
-            transformed_word = apply_word_telex(current_word_buffer)
-            if transformed_word:
-                for _ in range(len(current_word_buffer)):
-                    keyboard.send('backspace')
-                keyboard.write(transformed_word)
-            current_word_buffer = "" # Reset buffer
-            
-            keyboard.send(key_name) 
-            return
-        current_word_buffer = ""
-        keyboard.send(key_name)
-        return
+# --- Phiên gõ: hàng đợi, luồng xử lý, hook và bộ nhớ đệm của lõi, bộ quy tắc của file này ---
+class WordRulesState(SyllableState):
+    """
+    Từ đang gõ của bản Tk: dùng lại ảnh chụp, xóa lùi và giới hạn độ dài của SyllableState nhưng đổi chữ
+    bằng apply_word_telex ở trên. Bảng âm tiết dựng sẵn và trie tiền tố của lõi được tính theo bộ quy tắc
+    của lõi nên không dùng ở đây.
+    """
 
-    elif key_name == 'backspace':
-        if current_word_buffer:
-            current_word_buffer = current_word_buffer[:-1]
-        return 
+    def push(self, ch):
+        if self.overflow or len(self.word) >= MAX_SYLLABLE_LENGTH:
+            self.append(ch)
+            return None
+        typed_word = self.word + ch
+        transformed_word = self.cache.get(typed_word)
+        if transformed_word is TelexCache.MISS:
+            transformed_word = apply_word_telex(typed_word)
+            self.cache.put(typed_word, transformed_word)
+        if transformed_word and transformed_word != typed_word:
+            self._replace_word(transformed_word)
+            return transformed_word
+        self.append(ch)
+        return None
 
-    # Xử lý phím mũi tên và các phím điều khiển khác
-    if len(key_name) > 1:
-        current_word_buffer = "" 
-        return 
+class TkTelexSession(TelexSession):
+    """TelexSession của lõi với WordRulesState thay cho SyllableState."""
+    __slots__ = ()
 
-    # Nếu là ký tự gõ thông thường (chữ cái, số, dấu câu)
-    char = key_name 
-    
-    current_word_buffer += char
-
-    transformed_word = apply_word_telex(current_word_buffer)
-    if transformed_word:
-        for _ in range(len(current_word_buffer)):
-            keyboard.send('backspace')
-        keyboard.write(transformed_word)
-        current_word_buffer = transformed_word
-    # Nếu không chuyển đổi, ký tự đã được thêm vào buffer và được gõ bình thường bởi hệ thống.
-
-# --- Quản lý lắng nghe bàn phím ---
-def start_keyboard_listener():
-    global keyboard_hook
-    if keyboard_hook is None:
-        print("Starting keyboard listener...")
-        keyboard_hook = keyboard.on_press(lambda e: process_keyboard_event(e))
-        print("Keyboard listener started.")
-
-def stop_keyboard_listener():
-    global keyboard_hook
-    if keyboard_hook:
-        print("Stopping keyboard listener...")
-        keyboard.unhook(keyboard_hook)
-        keyboard_hook = None
-        print("Keyboard listener stopped.")
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.syllable = WordRulesState(self.cache)
 
 def set_telex_state(enabled):
-    global is_telex_enabled, config
-    
-    if is_telex_enabled == enabled:
+    """Chỉ gọi từ luồng Tk (khay hệ thống chuyển lời gọi qua call_in_tk_thread)."""
+    global telex_enabled
+    if telex_enabled == enabled:
         return
 
-    is_telex_enabled = enabled
+    telex_enabled = enabled
+    telex_session.set_enabled(enabled)
     config["enabled"] = enabled
     save_config()
 
     if root and status_label:
         if enabled:
             status_label.config(text="Trạng thái: Đang bật", style="Green.TLabel")
-            start_keyboard_listener()
         else:
             status_label.config(text="Trạng thái: Đang tắt", style="Red.TLabel")
-            stop_keyboard_listener()
     
     update_tray_menu()
 
+def call_in_tk_thread(func, *args):
+    """Chuyển lời gọi từ luồng khay hệ thống sang luồng Tk."""
+    if root:
+        root.after(0, func, *args)
+
 # --- Giao diện người dùng (Tkinter) ---
 def create_main_window():
     global root, status_label
+    import tkinter as tk
+    from tkinter import messagebox, ttk
     root = tk.Tk()
     root.title("VietPy Telex")
     root.geometry("280x180")
@@ -401,7 +343,7 @@ def create_main_window():
     status_label = ttk.Label(main_frame, text="")
     status_label.pack(pady=20)
 
-    toggle_button = ttk.Button(main_frame, text="Bật/Tắt gõ tiếng Việt", command=lambda: set_telex_state(not is_telex_enabled))
+    toggle_button = ttk.Button(main_frame, text="Bật/Tắt gõ tiếng Việt", command=lambda: set_telex_state(not telex_enabled))
     toggle_button.pack(pady=5)
 
     tray_button = ttk.Button(main_frame, text="Thu nhỏ xuống khay", command=lambda: root.withdraw() if root else None)
@@ -409,7 +351,7 @@ def create_main_window():
 
     def on_closing():
         if root and messagebox.askokcancel("Thoát VietPy Telex", "Bạn có muốn thoát hoàn toàn VietPy Telex không?"):
-            stop_keyboard_listener()
+            telex_session.close()
             if tray_icon:
                 tray_icon.stop()
             if root:
@@ -422,9 +364,10 @@ def create_main_window():
 # --- Quản lý Icon khay hệ thống (pystray) ---
 def setup_tray_icon():
     global tray_icon
+    from pystray import Icon as PyTrayIcon, MenuItem as PyTrayMenuItem
+    from PIL import Image, ImageDraw, ImageFont  # pip install Pillow
 
     image = Image.new('RGB', (64, 64), (0, 100, 255))
-    from PIL import ImageDraw, ImageFont
     draw = ImageDraw.Draw(image)
     try:
         font = ImageFont.truetype("arial.ttf", 40)
@@ -433,20 +376,20 @@ def setup_tray_icon():
     draw.text((10, 5), "V", font=font, fill=(255, 255, 255))
 
     menu_items = (
-        PyTrayMenuItem('Mở cửa sổ chính', lambda: root.deiconify() if root else None),
+        PyTrayMenuItem('Mở cửa sổ chính', lambda: call_in_tk_thread(root.deiconify) if root else None),
         PyTrayMenuItem(
             'Bật gõ tiếng Việt', 
-            lambda icon, item: set_telex_state(True), 
-            checked=lambda item: is_telex_enabled,
+            lambda icon, item: call_in_tk_thread(set_telex_state, True), 
+            checked=lambda item: telex_enabled,
             radio=True
         ),
         PyTrayMenuItem(
             'Tắt gõ tiếng Việt', 
-            lambda icon, item: set_telex_state(False), 
-            checked=lambda item: not is_telex_enabled,
+            lambda icon, item: call_in_tk_thread(set_telex_state, False), 
+            checked=lambda item: not telex_enabled,
             radio=True
         ),
-        PyTrayMenuItem('Thoát', lambda: root.quit() if root else None)
+        PyTrayMenuItem('Thoát', lambda: call_in_tk_thread(root.quit) if root else None)
     )
     
     tray_icon = PyTrayIcon("VietPy Telex", image, "VietPy Telex", menu_items)
@@ -455,15 +398,39 @@ def setup_tray_icon():
 def update_tray_menu():
     pass
 
+def handle_instance_command(command):
+    """Lệnh từ một lần chạy khác (chạy trên luồng Tk)."""
+    if command == "show":
+        root.deiconify()
+    elif command == "toggle":
+        set_telex_state(not telex_enabled)
+    elif command == "quit":
+        root.quit()
+
 # --- Hàm chính ---
 def main():
+    # Chỉ một bản (một hook bàn phím) được chạy; lần chạy sau gửi lệnh cho bản đang chạy rồi thoát
+    single_instance = SingleInstance(CONFIG_DIR)
+    if not single_instance.acquire():
+        sys.exit(single_instance.send(command_from_argv(sys.argv)))
+    global telex_session
     load_config()
+    telex_session = TkTelexSession(cache_size=config.get("telex_cache_size", 0))
     create_main_window()
     set_telex_state(config["enabled"])
     setup_tray_icon()
+    try:
+        single_instance.listen(lambda command: call_in_tk_thread(handle_instance_command, command))
+    except OSError as e:
+        print(f"Error opening instance channel: {e}")
     
     if root:
         root.mainloop()
+    telex_session.close()
+    if telex_session.cache.maxsize:
+        print(telex_session.cache.summary())
+    config.flush()
+    single_instance.close()
 
 if __name__ == "__main__":
     if platform.system() == "Windows":
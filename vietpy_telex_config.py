@@ -0,0 +1,127 @@
+# --- vietpy_telex_config.py ---
+# Cấu hình giữ trong bộ nhớ, ghi xuống config.json ở luồng nền: gộp các thay đổi liên tiếp thành một lần ghi,
+# ghi nguyên tử (file tạm cùng thư mục + fsync + os.replace) và ghi nốt khi thoát. Chỉ dùng thư viện chuẩn.
+
+import os
+import json
+import time
+import atexit
+import tempfile
+import threading
+
+SAVE_DELAY_S = 0.5  # các thay đổi trong khoảng này được gộp thành một lần ghi
+_MISSING = object()
+
+class ConfigStore(dict):
+    """
+    dict cấu hình có theo dõi thay đổi. save() chỉ đánh thức luồng ghi rồi trả về ngay (không chặn
+    luồng GUI/hook); luồng ghi chờ delay_s để gộp thay đổi rồi ghi nguyên tử. flush() ghi ngay.
+    """
+
+    def __init__(self, path, defaults, delay_s=SAVE_DELAY_S):
+        super().__init__(defaults)
+        self.path = path
+        self.defaults = dict(defaults)
+        self.delay_s = delay_s
+        self.dirty = False
+        self.writes = 0
+        self._lock = threading.Lock()  # bảo vệ nội dung và cờ dirty
+        self._write_lock = threading.Lock()  # mỗi lúc chỉ một lần ghi (luồng nền hoặc flush)
+        self._wake = threading.Event()
+        self._thread = None
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if self.get(key, _MISSING) != value:
+                super().__setitem__(key, value)
+                self.dirty = True
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def reset(self):
+        """Đưa về cấu hình mặc định (được ghi ở lần save/flush tiếp theo)."""
+        with self._lock:
+            self.clear()
+            super().update(self.defaults)
+            self.dirty = True
+
+    def load(self):
+        """Đọc file cấu hình (ghi nốt thay đổi đang chờ trước). File hỏng được giữ lại thành .bad."""
+        self.flush()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+            if not isinstance(loaded, dict):
+                raise ValueError("top-level value is not an object")
+        except FileNotFoundError:
+            print("Config file not found. Using default config.")
+            return
+        except (ValueError, OSError) as e:  # JSONDecodeError, UnicodeDecodeError là ValueError
+            print(f"Error loading config: {e}. Using default.")
+            self._keep_unreadable()
+            return
+        with self._lock:
+            super().update(loaded)
+
+    def _keep_unreadable(self):
+        try:
+            os.replace(self.path, self.path + ".bad")
+            print(f"Kept the unreadable config as {self.path}.bad")
+        except OSError:
+            pass
+
+    def save(self):
+        """Lên lịch ghi nếu có thay đổi; trả về ngay."""
+        if not self.dirty:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="VietPyTelexConfig", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.delay_s)  # gộp các thay đổi tới trong lúc chờ
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> bool:
+        """Ghi ngay nếu có thay đổi; False nếu ghi lỗi (thay đổi được giữ để ghi lại lần sau)."""
+        with self._write_lock:
+            with self._lock:
+                if not self.dirty:
+                    return True
+                data = json.dumps(self, ensure_ascii=False, indent=4)
+                self.dirty = False
+            try:
+                self._write_atomic(data)
+            except OSError as e:
+                print(f"Error saving config: {e}")
+                with self._lock:
+                    self.dirty = True
+                return False
+            self.writes += 1
+            return True
+
+    def _write_atomic(self, data):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try: os.unlink(tmp_path)
+            except OSError: pass
+            raise
+        if hasattr(os, 'O_DIRECTORY'):  # POSIX: fsync thư mục để việc đổi tên cũng bền khi mất điện
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try: os.fsync(dir_fd)
+            finally: os.close(dir_fd)
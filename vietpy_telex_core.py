@@ -0,0 +1,1474 @@
+# --- vietpy_telex_core.py ---
+# Lõi bộ gõ Telex: bảng quy tắc, đặt dấu thanh, âm tiết tăng dần và phiên gõ (TelexSession).
+# Chỉ dùng thư viện chuẩn, không tạo file/thư mục khi import; keyboard chỉ được nạp khi gắn hook hoặc gửi phím.
+
+import sys
+import os
+import mmap
+import struct
+import zlib
+import threading
+import time
+import queue
+from array import array
+from collections import OrderedDict, deque
+
+# CHAR_MAP, TONE_REMOVE_MAP, HAT_REMOVE_MAP, ACCENT_MARKS
+CHAR_MAP = {
+    'a': {'s': 'á', 'f': 'à', 'r': 'ả', 'x': 'ã', 'j': 'ạ', 'w': 'ă', 'aa': 'â'}, 'ă': {'s': 'ắ', 'f': 'ằ', 'r': 'ẳ', 'x': 'ẵ', 'j': 'ặ'},
+    'â': {'s': 'ấ', 'f': 'ầ', 'r': 'ẩ', 'x': 'ẫ', 'j': 'ậ'}, 'e': {'s': 'é', 'f': 'è', 'r': 'ẻ', 'x': 'ẽ', 'j': 'ẹ', 'ee': 'ê'},
+    'ê': {'s': 'ế', 'f': 'ề', 'r': 'ể', 'x': 'ễ', 'j': 'ệ'}, 'i': {'s': 'í', 'f': 'ì', 'r': 'ỉ', 'x': 'ĩ', 'j': 'ị'},
+    'o': {'s': 'ó', 'f': 'ò', 'r': 'ỏ', 'x': 'õ', 'j': 'ọ', 'w': 'ơ', 'oo': 'ô'}, 'ơ': {'s': 'ớ', 'f': 'ờ', 'r': 'ở', 'x': 'ỡ', 'j': 'ợ'},
+    'ô': {'s': 'ố', 'f': 'ồ', 'r': 'ổ', 'x': 'ỗ', 'j': 'ộ'}, 'u': {'s': 'ú', 'f': 'ù', 'r': 'ủ', 'x': 'ũ', 'j': 'ụ', 'w': 'ư'},
+    'ư': {'s': 'ứ', 'f': 'ừ', 'r': 'ử', 'x': 'ữ', 'j': 'ự'}, 'y': {'s': 'ý', 'f': 'ỳ', 'r': 'ỷ', 'x': 'ỹ', 'j': 'ỵ'},
+    'd': {'d': 'đ'}, 'uo': {'w': 'ươ'}, 'ia': {'w': 'ưa'}, 'uy': {'s': 'úy', 'f': 'ùy', 'r': 'ủy', 'x': 'ũy', 'j': 'ụy'},
+    'uyê': {'s': 'uyế', 'f': 'uyề', 'r': 'uyể', 'x': 'uyễ', 'j': 'uyệ'}, 'oai': {'s': 'oái', 'f': 'oài', 'r': 'oải', 'x': 'oãi', 'j': 'oại'},
+    'uay': {'s': 'uáy', 'f': 'uày', 'r': 'uảy', 'x': 'uãy', 'j': 'uạy'},
+}
+TONE_REMOVE_MAP = {
+    'á': 'a', 'à': 'a', 'ả': 'a', 'ã': 'a', 'ạ': 'a', 'ắ': 'ă', 'ằ': 'ă', 'ẳ': 'ă', 'ẵ': 'ă', 'ặ': 'ă',
+    'ấ': 'â', 'ầ': 'â', 'ẩ': 'â', 'ẫ': 'â', 'ậ': 'â', 'é': 'e', 'è': 'e', 'ẻ': 'e', 'ẽ': 'e', 'ẹ': 'e',
+    'ế': 'ê', 'ề': 'ê', 'ể': 'ê', 'ễ': 'ê', 'ệ': 'ê', 'í': 'i', 'ì': 'i', 'ỉ': 'i', 'ĩ': 'i', 'ị': 'i',
+    'ó': 'o', 'ò': 'o', 'ỏ': 'o', 'õ': 'o', 'ọ': 'o', 'ớ': 'ơ', 'ờ': 'ơ', 'ở': 'ơ', 'ỡ': 'ơ', 'ợ': 'ơ',
+    'ố': 'ô', 'ồ': 'ô', 'ổ': 'ô', 'ỗ': 'ô', 'ộ': 'ô', 'ú': 'u', 'ù': 'u', 'ủ': 'u', 'ũ': 'u', 'ụ': 'u',
+    'ứ': 'ư', 'ừ': 'ư', 'ử': 'ư', 'ữ': 'ư', 'ự': 'ư', 'ý': 'y', 'ỳ': 'y', 'ỷ': 'y', 'ỹ': 'y', 'ỵ': 'y',
+}
+HAT_REMOVE_MAP = {'ă': 'a', 'â': 'a', 'ê': 'e', 'ô': 'o', 'ơ': 'o', 'ư': 'u', 'đ': 'd'}
+ACCENT_MARKS = ['s', 'f', 'r', 'x', 'j']
+
+# === CÁC HẰNG SỐ MỚI ĐỂ XÁC ĐỊNH VỊ TRÍ ĐẶT DẤU CHUẨN ===
+VOWELS_WITH_HAT_OR_HOOK = "ăâêôơư"
+VOWELS_PLAIN = "aeiouy"
+
+# Danh sách các cụm nguyên âm và vị trí ưu tiên đặt dấu (index tương đối từ đầu cụm)
+# Sắp xếp từ dài nhất đến ngắn nhất để đảm bảo `uyê` được xử lý trước `yê`.
+VOWEL_CLUSTERS_ACCENT_PRIORITY = [
+    # Cụm 3 chữ
+    ("uyê", 2),  # khuy**ế**n
+    ("oai", 1),  # h**oà**i
+    ("uay", 1),  # kh**uấ**y
+    ("oay", 1),  # x**oá**y
+    ("iêu", 1),  # h**iế**u
+    ("yêu", 1),  # **yế**u
+    ("ươi", 2),  # t**ưởi**
+    ("uôi", 2),  # c**uối**
+    ("ươu", 2),  # h**ượu**
+
+    # Cụm 2 chữ (quan trọng nhất để sửa lỗi)
+    ("qu", -1),  # 'qu' là một cụm phụ âm-nguyên âm đặc biệt, dấu luôn đặt ở nguyên âm sau nó
+    ("gi", -1),  # Tương tự 'qu', dấu đặt ở nguyên âm sau 'i'
+    
+    ("ia", 0),   # ngh**ĩ**a
+    ("yê", 1),   # y**ế**n
+    ("iê", 1),   # t**iế**ng
+    ("ua", 0),   # m**ú**a
+    ("uô", 1),   # m**uố**n
+    ("ưa", 0),   # m**ư**a
+    ("ươ", 1),   # m**ướ**n
+    
+    ("ai", 0),   # l**ạ**i
+    ("ao", 0),   # l**à**o
+    ("au", 0),   # s**á**u
+    ("ay", 0),   # g**ầ**y
+    
+    ("ei", 0),   # (ít dùng)
+    ("eo", 0),   # k**é**o
+    ("eu", 0),   # tr**é**o
+    
+    ("oi", 0),   # t**ô**i
+    ("oa", 0),   # h**ò**a
+    ("oe", 0),   # l**o**e
+    ("oy", 0),   # (ít dùng)
+    
+    ("ui", 0),   # t**ú**i
+    ("uy", 1),   # q**uý**nh
+    ("uu", 0),   # (ít dùng)
+    
+    ("iu", 0),   # r**ì**u
+]
+
+# === ÂM TIẾT HỢP LỆ (dùng để sinh bảng âm tiết dựng sẵn) ===
+VALID_ONSETS = (
+    "", "b", "c", "ch", "d", "đ", "g", "gh", "gi", "h", "k", "kh", "l", "m", "n", "ng",
+    "ngh", "nh", "p", "ph", "qu", "r", "s", "t", "th", "tr", "v", "x",
+)
+VALID_RHYMES = tuple("""
+    a ai ao au ay ac ach am an ang anh ap at ăc ăm ăn ăng ăp ăt âc âm ân âng âp ât âu ây
+    e eo ec em en eng ep et ê êu êch êm ên ênh êp êt
+    i ia iu ich im in inh ip it iêc iêm iên iêng iêp iêt iêu
+    o oa oai oay oac oach oam oan oang oanh oap oat oăc oăm oăn oăng oăt oe oeo oen oet
+    oi oc om on ong op ot ô ôi ôc ôm ôn ông ôp ôt ơ ơi ơm ơn ơp ơt
+    u ua ui uy uya uyu uê uơ uân uâng uât uây uôi uôc uôm uôn uông uôt uc um un ung up ut
+    uych uyên uyêt uynh uyt uênh uêch ư ưa ưi ưu ưc ưng ưt ươi ươu ươc ươm ươn ương ươp ươt
+    y yêm yên yêt yêu
+""".split())
+STOP_CODAS = ("ch", "c", "p", "t")  # âm tiết tắc chỉ nhận dấu sắc và nặng
+
+def is_valid_syllable_part(onset: str, rhyme: str) -> bool:
+    """Ràng buộc chính tả giữa phụ âm đầu và vần (c/k, g/gh, ng/ngh, qu, gi, yê)."""
+    first = rhyme[0]
+    if onset in ("k", "gh", "ngh"): return first in "ieêy" and (onset == "k" or first != "y")
+    if onset in ("c", "g", "ng"): return first not in "ieêy"
+    if onset == "qu": return first not in "ouư" or rhyme.startswith("uy")
+    if onset == "gi": return first != "y"
+    if rhyme.startswith("yê"): return onset == ""
+    return True
+
+def syllable_spelling(onset: str, rhyme: str) -> str:
+    """Cách viết âm tiết: qu/gi dùng chung chữ u/i với vần uy-/i- (qu + uynh -> quynh, gi + in -> gin)."""
+    if (onset == "qu" and rhyme.startswith("uy")) or (onset == "gi" and rhyme[0] == "i"):
+        return onset[0] + rhyme
+    return onset + rhyme
+
+# === AUTOMAT ĐẶT DẤU (biên dịch một lần từ VOWEL_CLUSTERS_ACCENT_PRIORITY) ===
+# Các cụm nguyên âm được biên dịch thành automat Aho-Corasick. Mỗi trạng thái chỉ cần
+# nhớ cụm có độ ưu tiên cao nhất kết thúc tại đó, nên mỗi ký tự tốn O(1) dù thêm bao
+# nhiêu quy tắc. Các cụm đánh dấu 'qu'/'gi' (vị trí -1) được theo dõi riêng: mỗi cụm có
+# một lượt quét con bắt đầu từ nguyên âm đầu tiên sau lần xuất hiện cuối cùng của nó,
+# thay cho lời gọi đệ quy trước đây.
+_ALL_VOWELS = VOWELS_WITH_HAT_OR_HOOK + VOWELS_PLAIN
+_NO_CLUSTER = len(VOWEL_CLUSTERS_ACCENT_PRIORITY)
+
+def _build_vowel_automaton(rules):
+    goto = [{}]
+    best = [_NO_CLUSTER]
+    markers = [()]
+    marker_prio = []
+    for prio, (cluster, relative_pos) in enumerate(rules):
+        state = 0
+        for ch in cluster:
+            if ch not in goto[state]:
+                goto.append({})
+                best.append(_NO_CLUSTER)
+                markers.append(())
+                goto[state][ch] = len(goto) - 1
+            state = goto[state][ch]
+        if relative_pos == -1:
+            markers[state] += (len(marker_prio),)
+            marker_prio.append(prio)
+        else:
+            best[state] = min(best[state], prio)
+    alphabet = {ch for cluster, _ in rules for ch in cluster}
+    fail = [0] * len(goto)
+    queue = []
+    for ch in alphabet:
+        if ch in goto[0]:
+            queue.append(goto[0][ch])
+        else:
+            goto[0][ch] = 0
+    # Duyệt theo chiều rộng: gộp đầu ra theo liên kết lỗi và làm đầy bảng chuyển
+    for state in queue:
+        for ch in alphabet:
+            nxt = goto[state].get(ch)
+            if nxt is None:
+                goto[state][ch] = goto[fail[state]][ch]
+                continue
+            fail[nxt] = goto[fail[state]][ch]
+            best[nxt] = min(best[nxt], best[fail[nxt]])
+            markers[nxt] += markers[fail[nxt]]
+            queue.append(nxt)
+    return goto, best, markers, marker_prio
+
+_VOWEL_GOTO, _VOWEL_BEST, _VOWEL_MARKERS, _MARKER_PRIO = _build_vowel_automaton(VOWEL_CLUSTERS_ACCENT_PRIORITY)
+_CLUSTER_LEN = [len(cluster) for cluster, _ in VOWEL_CLUSTERS_ACCENT_PRIORITY]
+_CLUSTER_REL = [relative_pos for _, relative_pos in VOWEL_CLUSTERS_ACCENT_PRIORITY]
+_MARKER_LEN = [_CLUSTER_LEN[prio] for prio in _MARKER_PRIO]
+
+# Trạng thái quét con: (trạng thái automat, vị trí nguyên âm mũ/móc cuối, vị trí nguyên âm
+# thường cuối, độ ưu tiên cụm tốt nhất, vị trí bắt đầu cụm đó)
+_SUB_SCAN_INIT = (0, -1, -1, _NO_CLUSTER, -1)
+# Trạng thái quét đầy đủ: (quét gốc, ((vị trí cụm đánh dấu, gốc quét con, quét con), ...))
+VOWEL_SCAN_INIT = (_SUB_SCAN_INIT, ((-1, -1, None),) * len(_MARKER_PRIO))
+
+def _sub_scan_step(sub, ch, i):
+    state, hat, vowel, best_prio, best_start = sub
+    state = _VOWEL_GOTO[state].get(ch, 0)
+    if ch in VOWELS_WITH_HAT_OR_HOOK: hat = i
+    elif ch in VOWELS_PLAIN: vowel = i
+    prio = _VOWEL_BEST[state]
+    # '<=' để lần xuất hiện muộn hơn của cùng một cụm thay thế (tương đương rfind)
+    if prio != _NO_CLUSTER and prio <= best_prio:
+        best_prio, best_start = prio, i - _CLUSTER_LEN[prio] + 1
+    return (state, hat, vowel, best_prio, best_start)
+
+def vowel_scan_step(scan, ch, i):
+    """Đưa ký tự thường `ch` ở vị trí `i` vào trạng thái quét, trả về trạng thái mới."""
+    root, marks = scan
+    root = _sub_scan_step(root, ch, i)
+    ended = _VOWEL_MARKERS[root[0]]
+    new_marks = []
+    for k, (start, origin, child) in enumerate(marks):
+        if k in ended:
+            start, origin, child = i - _MARKER_LEN[k] + 1, -1, None
+        elif child is not None:
+            child = _sub_scan_step(child, ch, i)
+        elif start != -1 and ch in _ALL_VOWELS:
+            origin, child = i, _sub_scan_step(_SUB_SCAN_INIT, ch, i)
+        new_marks.append((start, origin, child))
+    return (root, tuple(new_marks))
+
+def _resolve_sub_scan(sub, origin, marks, word):
+    _, hat, vowel, best_prio, best_start = sub
+    # 1. Ưu tiên cao nhất: các nguyên âm có mũ/móc (ă, â, ê, ô, ơ, ư)
+    if hat != -1:
+        return hat
+    # 2. Cụm 'gi'/'qu' đứng trước cụm thường tốt nhất: đặt dấu theo phần sau nó
+    for k, prio in enumerate(_MARKER_PRIO):
+        if prio > best_prio:
+            break
+        start, child_origin, child = marks[k]
+        if start >= origin and child is not None:
+            return _resolve_sub_scan(child, child_origin, marks, word)
+    if best_prio != _NO_CLUSTER:
+        cluster_len = _CLUSTER_LEN[best_prio]
+        # Âm tiết đóng với nguyên âm đôi: dấu đặt ở nguyên âm thứ 2
+        end = best_start + cluster_len
+        if cluster_len == 2 and end < len(word) and word[end].lower() not in VOWELS_PLAIN:
+            return best_start + 1
+        return best_start + _CLUSTER_REL[best_prio]
+    # 3. Trường hợp cuối cùng: nguyên âm đơn cuối cùng
+    return vowel
+
+def resolve_vowel_scan(scan, word):
+    """Trả về vị trí đặt dấu từ trạng thái quét của `word` (không cần duyệt lại từ)."""
+    root, marks = scan
+    return _resolve_sub_scan(root, 0, marks, word)
+
+def scan_tone_position(word_lower: str) -> int:
+    """Vị trí đặt dấu theo automat, duyệt từ một lần từ trái sang phải."""
+    scan = VOWEL_SCAN_INIT
+    for i, ch in enumerate(word_lower):
+        scan = vowel_scan_step(scan, ch, i)
+    return resolve_vowel_scan(scan, word_lower)
+
+# === BẢNG ĐẶT DẤU THEO VẦN: (cụm nguyên âm, có âm cuối) -> vị trí tương đối ===
+# Dựng khi import bằng chính các quy tắc ở trên, cho các cụm nguyên âm của VALID_RHYMES
+# (kèm dạng chưa gõ mũ/móc như 'ie', 'uo'). Quy tắc âm tiết đóng/mở nằm sẵn trong khóa.
+_MARKER_CLUSTERS = tuple(cluster for cluster, relative_pos in VOWEL_CLUSTERS_ACCENT_PRIORITY if relative_pos == -1)
+
+def _build_rhyme_tone_index():
+    nuclei = set(_ALL_VOWELS)
+    for rhyme in VALID_RHYMES:
+        nucleus = rhyme[:len(rhyme) - len(rhyme.lstrip(_ALL_VOWELS))]
+        nuclei.add(nucleus)
+        nuclei.add(''.join(HAT_REMOVE_MAP.get(ch, ch) for ch in nucleus))
+    index = {}
+    for nucleus in nuclei:
+        for has_coda in (False, True):
+            index[(nucleus, has_coda)] = scan_tone_position(nucleus + ('n' if has_coda else ''))
+    return index
+
+RHYME_TONE_INDEX = _build_rhyme_tone_index()
+
+def rhyme_tone_position(word_lower: str, start: int, end: int):
+    """
+    Vị trí đặt dấu khi word_lower[start:end] là cụm nguyên âm duy nhất của từ.
+    Trả về None nếu bảng không áp dụng được (cụm lạ, hoặc 'qu'/'gi' đứng trước cụm).
+    """
+    if start > 0 and word_lower[start - 1:start + 1] in _MARKER_CLUSTERS:
+        return None
+    relative_pos = RHYME_TONE_INDEX.get((word_lower[start:end], end < len(word_lower)))
+    return None if relative_pos is None else start + relative_pos
+
+def find_main_vowel_position(word: str) -> int:
+    """
+    Tìm vị trí của nguyên âm chính để đặt dấu thanh, tuân thủ quy tắc âm tiết đóng/mở.
+    Tách cụm nguyên âm một lần rồi tra RHYME_TONE_INDEX; các trường hợp còn lại dùng automat.
+    """
+    word_lower = word.lower()
+    start = 0
+    while start < len(word_lower) and word_lower[start] not in _ALL_VOWELS:
+        start += 1
+    if start == len(word_lower):
+        return -1
+    end = start + 1
+    while end < len(word_lower) and word_lower[end] in _ALL_VOWELS:
+        end += 1
+    if not any(ch in _ALL_VOWELS for ch in word_lower[end:]):
+        pos = rhyme_tone_position(word_lower, start, end)
+        if pos is not None:
+            return pos
+    return scan_tone_position(word_lower)
+
+# === BẢNG TỔ HỢP KÝ TỰ: (nguyên âm gốc, mũ/móc, dấu thanh, hoa/thường) -> mã ký tự ===
+# Dựng một lần từ CHAR_MAP. Thêm/bỏ/thay dấu thanh hay mũ/móc chỉ là cộng/trừ chỉ số trong
+# mảng, không cần tra dict lồng nhau hay sửa hoa/thường sau đó.
+HAT_NONE, HAT_CIRCUMFLEX, HAT_HOOK, HAT_STROKE = 0, 1, 2, 3  # _, â/ê/ô, ă/ơ/ư, đ
+TONE_INDEX = {mark: i + 1 for i, mark in enumerate(ACCENT_MARKS)}
+_TONE_COUNT = len(ACCENT_MARKS) + 1
+_TONE_STRIDE = 2
+_HAT_STRIDE = _TONE_COUNT * _TONE_STRIDE
+_BASE_STRIDE = 4 * _HAT_STRIDE
+
+def _build_composition_tables():
+    bases = [base for base in CHAR_MAP if len(base) == 1 and base not in HAT_REMOVE_MAP]
+    table = array('I', [0]) * (len(bases) * _BASE_STRIDE)
+
+    def put(index, char, rules):
+        table[index], table[index + 1] = ord(char), ord(char.upper())
+        for rule, result in rules.items():
+            if rule in TONE_INDEX:
+                put(index + TONE_INDEX[rule] * _TONE_STRIDE, result, {})
+
+    for base_index, base in enumerate(bases):
+        index = base_index * _BASE_STRIDE
+        put(index, base, CHAR_MAP[base])
+        for rule, result in CHAR_MAP[base].items():
+            if rule in TONE_INDEX: continue
+            hat = HAT_HOOK if rule == 'w' else HAT_STROKE if rule == base else HAT_CIRCUMFLEX
+            put(index + hat * _HAT_STRIDE, result, CHAR_MAP.get(result, {}))
+    decompose = {chr(code): index for index, code in enumerate(table) if code}
+    return table, decompose
+
+COMPOSE_TABLE, DECOMPOSE = _build_composition_tables()
+COMPOSE_CHARS = tuple(chr(code) if code else '' for code in COMPOSE_TABLE)  # ký tự dựng sẵn, không cấp phát khi tra
+_INDEX_TONE = bytes((i // _TONE_STRIDE) % _TONE_COUNT for i in range(len(COMPOSE_TABLE)))
+_INDEX_HAT = bytes((i // _HAT_STRIDE) % 4 for i in range(len(COMPOSE_TABLE)))
+
+def compose_tone(char, mark):
+    """Thêm dấu thanh `mark` (s, f, r, x, j) vào ký tự chưa có dấu thanh; None nếu không áp dụng được."""
+    index = DECOMPOSE.get(char)
+    if index is None or _INDEX_TONE[index]: return None
+    return COMPOSE_CHARS[index + TONE_INDEX[mark] * _TONE_STRIDE] or None
+
+def compose_hat(char, hat):
+    """Thêm mũ/móc `hat` vào ký tự chưa có dấu; None nếu không áp dụng được."""
+    index = DECOMPOSE.get(char)
+    if index is None or _INDEX_TONE[index] or _INDEX_HAT[index]: return None
+    return COMPOSE_CHARS[index + hat * _HAT_STRIDE] or None
+
+def strip_tone_or_hat(char):
+    """Bỏ dấu thanh nếu có, nếu không thì bỏ mũ/móc (một bước của phím 'z')."""
+    index = DECOMPOSE.get(char)
+    if index is None: return char
+    if _INDEX_TONE[index]: return COMPOSE_CHARS[index - _INDEX_TONE[index] * _TONE_STRIDE]
+    if _INDEX_HAT[index]: return COMPOSE_CHARS[index - _INDEX_HAT[index] * _HAT_STRIDE]
+    return char
+
+# === AUTOMAT TIỀN TỐ ÂM TIẾT: trie trên chữ cái gốc (bỏ dấu thanh, mũ/móc; đ -> d) ===
+# Dựng từ mọi cặp phụ âm đầu + vần hợp lệ. Khi từ đang gõ rơi khỏi trie (vd: "str", "thk",
+# hơn 7 chữ) thì không phím nào sau đó có thể cho ra âm tiết đúng, nên bỏ qua bộ quy tắc.
+def base_letter(char):
+    """Chữ cái gốc viết thường của một ký tự (vd: 'Ế' -> 'e', 'đ' -> 'd')."""
+    index = DECOMPOSE.get(char)
+    if index is None: return char.lower()
+    return COMPOSE_CHARS[index - index % _BASE_STRIDE]
+
+def _build_prefix_trie():
+    root = {}
+    letters = {ch: base_letter(ch) for ch in set(''.join(VALID_ONSETS + VALID_RHYMES))}  # bỏ dấu mỗi chữ một lần
+    for onset in VALID_ONSETS:
+        start = root
+        for ch in onset:
+            start = start.setdefault(letters[ch], {})
+        for rhyme in VALID_RHYMES:
+            if not is_valid_syllable_part(onset, rhyme): continue
+            node = start
+            for ch in syllable_spelling(onset, rhyme)[len(onset):]:
+                node = node.setdefault(letters[ch], {})
+    return root
+
+SYLLABLE_PREFIX_TRIE = _build_prefix_trie()
+
+# Các hàm phụ trợ
+def transform_char_case(original_char, transformed_char_base):
+    if not original_char or not transformed_char_base: return transformed_char_base
+    if original_char.isupper(): return transformed_char_base.upper()
+    return transformed_char_base.lower()
+
+def apply_telex_rule_to_char_or_cluster(target_segment, rule_char):
+    lower_target = target_segment.lower()
+    if lower_target in CHAR_MAP and rule_char in CHAR_MAP[lower_target]:
+        result = CHAR_MAP[lower_target][rule_char]
+        if target_segment.isupper() and len(target_segment) > 1: return result.upper()
+        return transform_char_case(target_segment[0], result)
+    return None
+
+def apply_unaccent_rule(word_in, main_vowel_pos=None):
+    if main_vowel_pos is None: main_vowel_pos = find_main_vowel_position(word_in)
+    if main_vowel_pos == -1: return word_in
+    original_char_at_pos = word_in[main_vowel_pos]
+    transformed_char = strip_tone_or_hat(original_char_at_pos)
+    if transformed_char == original_char_at_pos: return word_in
+    return word_in[:main_vowel_pos] + transformed_char + word_in[main_vowel_pos+1:]
+
+# Hàm apply_word_telex: `accent_pos` là vị trí đặt dấu đã tính sẵn cho word_in[:-1] (nếu có)
+def apply_word_telex(word_in, accent_pos=None):
+    if not word_in: return None
+    last_char = word_in[-1].lower()
+    word_base = word_in[:-1]
+    if last_char == 'd' and len(word_in) >= 2 and word_in[-2].lower() == 'd':
+        return word_in[:-2] + compose_hat('d', HAT_STROKE)
+    if last_char == 'z':
+        if not word_base: return None
+        return apply_unaccent_rule(word_base, accent_pos)
+    if last_char == 'w':
+        if not word_base: return None
+        if len(word_base) >= 2:
+            transformed = apply_telex_rule_to_char_or_cluster(word_base[-2:], 'w')  # cụm: uo -> ươ
+            if transformed: return word_base[:-2] + transformed
+        transformed = compose_hat(word_base[-1], HAT_HOOK)
+        if transformed: return word_base[:-1] + transformed
+        return None
+    if last_char in ACCENT_MARKS:
+        if not word_base: return None
+        if accent_pos is None: accent_pos = find_main_vowel_position(word_base)
+        if accent_pos != -1:
+            char_to_accent = word_base[accent_pos]
+            transformed_char = compose_tone(char_to_accent, last_char)
+            if transformed_char:
+                return word_base[:accent_pos] + transformed_char + word_base[accent_pos+1:]
+    if len(word_in) >= 2 and word_in[-1].lower() == word_in[-2].lower():
+        double_char = word_in[-1].lower()
+        if double_char in ['a', 'e', 'o']:
+            transformed = compose_hat(word_in[-2], HAT_CIRCUMFLEX)
+            if transformed: return word_in[:-2] + transformed
+    return None
+
+# --- Bộ nhớ đệm LRU cho apply_word_telex (tùy chọn, bật bằng "telex_cache_size") ---
+class TelexCache:
+    """Bộ nhớ đệm LRU có giới hạn, khóa là chuỗi buffer; maxsize = 0 nghĩa là tắt."""
+    MISS = object()
+
+    def __init__(self, maxsize=0):
+        self._entries = OrderedDict()
+        self.maxsize = 0
+        self.hits = self.misses = self.evictions = 0
+        self.resize(maxsize)
+
+    def resize(self, maxsize):
+        try: self.maxsize = max(0, int(maxsize))
+        except (TypeError, ValueError): self.maxsize = 0
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, word):
+        """Trả về kết quả đã lưu cho `word`, hoặc TelexCache.MISS."""
+        if not self.maxsize: return self.MISS
+        result = self._entries.get(word, self.MISS)
+        if result is self.MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(word)
+        return result
+
+    def put(self, word, result):
+        if not self.maxsize: return
+        self._entries[word] = result
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries), "maxsize": self.maxsize,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def summary(self) -> str:
+        if not self.maxsize: return "Bộ nhớ đệm: tắt"
+        stats = self.stats()
+        return (f"Bộ nhớ đệm: trúng {stats['hits']}/{stats['hits'] + stats['misses']} ({stats['hit_rate']:.0%}), "
+                f"{stats['size']}/{stats['maxsize']} mục, bỏ {stats['evictions']}")
+
+# --- Bảng âm tiết dựng sẵn (syllables.bin, sinh bởi build_syllable_table.py) ---
+# Định dạng: header SYLLABLE_TABLE_HEADER, sau đó là bảng băm địa chỉ mở gồm các cặp
+# (offset khóa, offset giá trị) kiểu u32, rồi vùng chuỗi (1 byte độ dài + UTF-8).
+# Khóa là buffer sau khi nhấn phím, giá trị là kết quả apply_word_telex (NONE = không đổi).
+SYLLABLE_TABLE_FILE = os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))), 'syllables.bin')
+SYLLABLE_TABLE_MAGIC = b"VPTX"
+SYLLABLE_TABLE_FORMAT = 1
+SYLLABLE_TABLE_HEADER = struct.Struct("<4sHH16sIII")  # magic, format, flags, hash, số ô, số mục, offset chuỗi
+SYLLABLE_TABLE_SLOT = struct.Struct("<II")
+SYLLABLE_TABLE_EMPTY = 0xFFFFFFFF
+SYLLABLE_TABLE_NONE = 0xFFFFFFFE
+TELEX_ENGINE_REVISION = 1  # tăng khi đổi logic apply_word_telex để vô hiệu bảng cũ
+
+def telex_tables_hash() -> bytes:
+    """Mã băm phiên bản của các bảng quy tắc; bảng âm tiết chỉ được dùng khi khớp mã này."""
+    import hashlib  # chỉ cần khi mở bảng âm tiết, không nạp lúc import
+    source = repr((TELEX_ENGINE_REVISION, CHAR_MAP, TONE_REMOVE_MAP, HAT_REMOVE_MAP,
+                   ACCENT_MARKS, VOWEL_CLUSTERS_ACCENT_PRIORITY))
+    return hashlib.blake2b(source.encode('utf-8'), digest_size=16).digest()
+
+def syllable_table_slot(key: bytes, mask: int) -> int:
+    return zlib.crc32(key) & mask
+
+class SyllableTable:
+    """
+    Bảng chuyển trạng thái ánh xạ bộ nhớ; chỉ mở file ở lần tra cứu đầu tiên. Dùng chung cho mọi
+    phiên: bảng chỉ đọc, việc mở file và bộ đếm được giữ bằng khóa.
+    """
+    MISS = TelexCache.MISS
+
+    def __init__(self, path=SYLLABLE_TABLE_FILE):
+        self.path = path
+        self._map = None
+        self._opened = False
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _open(self):
+        with self._lock:
+            if not self._opened:
+                self._load()
+                self._opened = True
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+        try:
+            magic, fmt, _, digest, slots, _, strings = SYLLABLE_TABLE_HEADER.unpack_from(data, 0)
+        except struct.error:
+            magic = None
+        if magic != SYLLABLE_TABLE_MAGIC or fmt != SYLLABLE_TABLE_FORMAT or digest != telex_tables_hash():
+            print(f"Syllable table {self.path} is stale or invalid. Using rule engine.")
+            data.close()
+            return
+        self._map = data
+        self._mask = slots - 1
+        self._strings = strings
+
+    def _string_at(self, offset):
+        start = self._strings + offset
+        return self._map[start + 1:start + 1 + self._map[start]]
+
+    def get(self, word):
+        """Trả về kết quả apply_word_telex đã dựng sẵn cho `word`, hoặc SyllableTable.MISS."""
+        if not self._opened: self._open()
+        if self._map is None: return self.MISS
+        key = word.encode('utf-8')
+        slot = syllable_table_slot(key, self._mask)
+        while True:
+            key_offset, value_offset = SYLLABLE_TABLE_SLOT.unpack_from(self._map, SYLLABLE_TABLE_HEADER.size + slot * SYLLABLE_TABLE_SLOT.size)
+            if key_offset == SYLLABLE_TABLE_EMPTY:
+                with self._lock: self.misses += 1
+                return self.MISS
+            if self._string_at(key_offset) == key:
+                with self._lock: self.hits += 1
+                return None if value_offset == SYLLABLE_TABLE_NONE else self._string_at(value_offset).decode('utf-8')
+            slot = (slot + 1) & self._mask
+
+syllable_table = SyllableTable()
+
+# --- Trạng thái âm tiết tăng dần theo từng phím ---
+def _build_char_info():
+    """Thông tin từng ký tự từ CHAR_MAP: (là nguyên âm, có mũ/móc, dấu thanh)."""
+    info = {}
+    for base, rules in CHAR_MAP.items():
+        if len(base) != 1: continue
+        is_vowel = base in _ALL_VOWELS
+        info[base] = (is_vowel, base in VOWELS_WITH_HAT_OR_HOOK, '')
+        for rule, result in rules.items():
+            if rule in ACCENT_MARKS:
+                info[result] = (True, base in VOWELS_WITH_HAT_OR_HOOK, rule)
+            elif len(result) == 1:
+                info.setdefault(result, (is_vowel, True, ''))
+    return info
+
+_CHAR_INFO = _build_char_info()
+_PLAIN_CHAR_INFO = (False, False, '')
+
+# Bảng phân loại phím: chỉ các phím có trong bảng mới có thể làm apply_word_telex đổi chữ,
+# mọi phím khác (số, dấu câu, đa số phụ âm) chỉ cần thêm vào buffer.
+KEY_TONE, KEY_HAT, KEY_DOUBLE, KEY_UNACCENT = 1, 2, 3, 4
+
+def _build_key_classes():
+    classes = {mark: KEY_TONE for mark in ACCENT_MARKS}
+    classes['w'] = KEY_HAT
+    classes['z'] = KEY_UNACCENT
+    for base, rules in CHAR_MAP.items():
+        for rule in rules:
+            if rule == base or rule == base * 2:  # dd ('d': {'d': 'đ'}), aa, ee, oo
+                classes[base] = KEY_DOUBLE
+    classes.update({key.upper(): key_class for key, key_class in classes.items()})
+    return classes
+
+KEY_CLASSES = _build_key_classes()
+
+def common_prefix_length(a: str, b: str) -> int:
+    n = 0
+    limit = min(len(a), len(b))
+    while n < limit and a[n] == b[n]:
+        n += 1
+    return n
+
+# Âm tiết dài nhất ("nghiêng") có 7 chữ, cộng thêm một phím Telex đang chờ áp dụng.
+# Vượt quá giới hạn này (URL, mã băm, code rút gọn...) thì từ được cho qua nguyên vẹn.
+MAX_SYLLABLE_LENGTH = 8
+
+class SyllableState:
+    """
+    Âm tiết đang gõ, được cập nhật theo từng phím thay vì phân tích lại cả từ.
+    Mỗi ký tự lưu một ảnh chụp trạng thái (quét đặt dấu, vần, mũ/móc, dấu thanh) nên
+    phím xóa chỉ cần bỏ ảnh chụp cuối, và khi một quy tắc đổi chữ thì chỉ phần đuôi
+    bị thay đổi được quét lại. Khi từ dài quá MAX_SYLLABLE_LENGTH, các phím tiếp theo chỉ
+    được đếm (overflow) cho tới khi ngắt từ, nên chi phí mỗi phím không tăng theo độ dài.
+    Khi từ không còn là tiền tố của âm tiết nào (dead), push() không chạy bộ quy tắc nữa.
+    """
+    # Ảnh chụp: (trạng thái quét, đầu vần, cuối vần, vị trí mũ/móc cuối, dấu thanh,
+    #            có nguyên âm sau âm cuối, nút trie tiền tố hoặc None nếu từ đã "chết")
+    _INIT = (VOWEL_SCAN_INIT, -1, -1, -1, '', False, SYLLABLE_PREFIX_TRIE)
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else TelexCache()  # mặc định tắt (maxsize 0)
+        self.reset()
+
+    def reset(self):
+        self.word = ""
+        self._snapshots = [self._INIT]
+        self.overflow = 0
+        self._pinned = False
+
+    def pass_through(self):
+        """Cho phần còn lại của từ đi qua nguyên vẹn tới khi ngắt từ (vd: phím đang được giữ lặp)."""
+        self.overflow += 1
+        self._pinned = True
+
+    def __len__(self):
+        return len(self.word) + self.overflow
+
+    @property
+    def passthrough(self) -> bool:
+        return self.overflow > 0
+
+    @property
+    def dead(self) -> bool:
+        return self._snapshots[-1][6] is None
+
+    @property
+    def onset(self) -> str:
+        start = self._snapshots[-1][1]
+        return self.word if start == -1 else self.word[:start]
+
+    @property
+    def nucleus(self) -> str:
+        start, end = self._snapshots[-1][1:3]
+        return "" if start == -1 else self.word[start:end]
+
+    @property
+    def coda(self) -> str:
+        end = self._snapshots[-1][2]
+        return "" if end == -1 else self.word[end:]
+
+    @property
+    def hat(self) -> bool:
+        return self._snapshots[-1][3] != -1
+
+    @property
+    def tone(self) -> str:
+        return self._snapshots[-1][4]
+
+    def accent_position(self) -> int:
+        scan, start, end, _, tone, split, _ = self._snapshots[-1]
+        # Từ chưa có dấu thanh và chỉ có một cụm nguyên âm: tra bảng theo vần
+        if start != -1 and not tone and not split:
+            pos = rhyme_tone_position(self.word.lower(), start, end)
+            if pos is not None:
+                return pos
+        return resolve_vowel_scan(scan, self.word)
+
+    def append(self, ch):
+        """Thêm ký tự mà không chạy quy tắc Telex (dùng cho phím không có trong KEY_CLASSES)."""
+        if self.overflow or len(self.word) >= MAX_SYLLABLE_LENGTH:
+            self.overflow += 1
+            return
+        scan, start, end, hat, tone, split, prefix = self._snapshots[-1]
+        i = len(self.word)
+        is_vowel, has_hat, char_tone = _CHAR_INFO.get(ch.lower(), _PLAIN_CHAR_INFO)
+        if is_vowel:
+            if start == -1: start, end = i, i + 1
+            elif end == i: end = i + 1
+            else: split = True
+        if has_hat: hat = i
+        if char_tone: tone = char_tone
+        if prefix is not None: prefix = prefix.get(base_letter(ch))
+        self._snapshots.append((vowel_scan_step(scan, ch.lower(), i), start, end, hat, tone, split, prefix))
+        self.word += ch
+
+    def _replace_word(self, new_word):
+        # Giữ lại ảnh chụp của phần đầu chung, chỉ quét lại phần đuôi đã đổi
+        common = common_prefix_length(self.word, new_word)
+        del self._snapshots[common + 1:]
+        self.word = new_word[:common]
+        for ch in new_word[common:]:
+            self.append(ch)
+
+    def push(self, ch):
+        """Thêm một phím. Trả về từ mới nếu có quy tắc Telex được áp dụng, ngược lại None."""
+        key_class = KEY_CLASSES.get(ch)
+        if key_class is None or self.overflow or len(self.word) >= MAX_SYLLABLE_LENGTH or self.dead:
+            self.append(ch)
+            return None
+        typed_word = self.word + ch
+        transformed_word = syllable_table.get(typed_word)
+        if transformed_word is SyllableTable.MISS:
+            transformed_word = self.cache.get(typed_word)
+        if transformed_word is TelexCache.MISS:
+            accent_pos = self.accent_position() if key_class in (KEY_TONE, KEY_UNACCENT) else None
+            transformed_word = apply_word_telex(typed_word, accent_pos)
+            self.cache.put(typed_word, transformed_word)
+        if transformed_word and transformed_word != typed_word:
+            self._replace_word(transformed_word)
+            return transformed_word
+        self.append(ch)
+        return None
+
+    def pop(self):
+        """Xử lý phím xóa: bỏ ký tự cuối và trạng thái tương ứng."""
+        if self.overflow:
+            if not self._pinned: self.overflow -= 1
+        elif self.word:
+            self.word = self.word[:-1]
+            self._snapshots.pop()
+
+# --- Gửi phím: sổ phím tự gửi (để bỏ qua khi hook báo lại) và các cách gửi ---
+INJECTION_ECHO_TIMEOUT_NS = 500_000_000  # phím tự gửi không quay lại hook sau 0.5s thì bỏ khỏi sổ
+
+ECHO_KEY_NAMES = {'\b': 'backspace', '\n': 'enter', '\t': 'tab', ' ': 'space'}  # tên phím hook báo lại
+
+class InjectionLedger:
+    """
+    Sổ ghi các phím do chính chương trình gửi đi mà hook sẽ thấy lại như phím thật; mỗi lần gửi được
+    gắn số thứ tự và ghi trước vào sổ để hook nhận ra và bỏ qua. Chỉ ghi những gì hệ điều hành thật sự
+    báo lại: trên Windows keyboard.write và SendInput gửi mọi ký tự trừ phím xóa và Enter dạng gói
+    Unicode mà thư viện keyboard tự lọc, nên chỉ hai phím đó quay lại; hệ điều hành khác keyboard.write
+    gõ ký tự ASCII bằng phím thật nên chúng cũng quay lại. Ghi thừa một phím không quay lại sẽ nuốt
+    mất phím thật cùng tên người dùng gõ ngay sau đó.
+    """
+    echoes_text = sys.platform != "win32"
+
+    def __init__(self, echoes_text=None):
+        self._expected = deque()  # (số thứ tự lần gửi, tên phím, hạn chót ns)
+        self._released = {}  # tên phím tự gửi đã khớp -> số lần nhả phím còn chờ
+        self.sequence = 0
+        self.dropped = self.expired = 0
+        if echoes_text is not None: self.echoes_text = echoes_text
+
+    def echo_name(self, ch):
+        """Tên phím hook báo lại khi gửi ký tự ch; None nếu hook không thấy lại."""
+        if ch in '\b\n': return ECHO_KEY_NAMES[ch]
+        if not self.echoes_text: return None
+        if ch in ECHO_KEY_NAMES: return ECHO_KEY_NAMES[ch]
+        return ch.lower() if ch.isascii() and ch.isprintable() else None
+
+    def expect(self, text):
+        """Ghi trước các phím sắp gửi (gọi ngay trước khi gửi); ký tự hook không thấy lại được bỏ qua."""
+        self.sequence += 1
+        deadline = time.perf_counter_ns() + INJECTION_ECHO_TIMEOUT_NS
+        for ch in text:
+            name = self.echo_name(ch)
+            if name is not None:
+                self._expected.append((self.sequence, name, deadline))
+
+    def match(self, name):
+        """Gọi đầu hook với mỗi sự kiện nhấn phím: True nếu đó là phím tự gửi (cần bỏ qua)."""
+        expected = self._expected
+        if not expected or not name: return False
+        now = time.perf_counter_ns()
+        while expected and expected[0][2] < now:
+            expected.popleft()
+            self.expired += 1
+        if expected and expected[0][1] == name.lower():
+            expected.popleft()
+            self.dropped += 1
+            name = name.lower()
+            self._released[name] = self._released.get(name, 0) + 1
+            return True
+        return False
+
+    def match_up(self, name):
+        """Gọi với mỗi sự kiện nhả phím: True nếu đó là lần nhả của một phím tự gửi đã khớp ở match()."""
+        released = self._released
+        if not released or not name: return False
+        name = name.lower()
+        if name not in released: return False
+        if released[name] > 1: released[name] -= 1
+        else: del released[name]
+        return True
+
+    def stats(self):
+        return {"pending": len(self._expected), "sequence": self.sequence,
+                "dropped": self.dropped, "expired": self.expired}
+
+KEY_DOWN, KEY_UP = 'down', 'up'  # trùng keyboard.KEY_DOWN/KEY_UP
+
+def _load_keyboard():
+    """Nạp thư viện keyboard khi thật sự cần (gắn hook, gửi phím), để import lõi không kéo theo hook hệ thống."""
+    import keyboard
+    return keyboard
+
+class KeyboardEmitter:
+    """Gửi phím bằng keyboard.write: một lần cho các phím xóa, một lần cho phần chữ mới."""
+    name = "keyboard"
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self._write = _load_keyboard().write
+
+    def emit(self, backspaces, text):
+        if backspaces:
+            self.ledger.expect('\b' * backspaces)
+            self._write('\b' * backspaces)
+        if text:
+            self.ledger.expect(text)
+            self._write(text)
+
+class BatchedEmitter:
+    """
+    Gửi phím xóa và phần chữ mới trong một lần gọi. Trên Windows dùng một lệnh SendInput duy nhất
+    (chữ gửi dạng gói Unicode, hook không thấy lại); hệ điều hành khác gộp thành một keyboard.write.
+    """
+    name = "batched"
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self._send_input = _load_send_input() if sys.platform == "win32" else None
+        self._write = _load_keyboard().write if self._send_input is None else None
+
+    def emit(self, backspaces, text):
+        if self._send_input is not None:
+            self.ledger.expect('\b' * backspaces)
+            self._send_input(backspaces, text)
+            return
+        output = '\b' * backspaces + text
+        if output:
+            self.ledger.expect(output)
+            self._write(output)
+
+class RecordingEmitter:
+    """Không gửi gì ra hệ điều hành, chỉ ghi lại chuỗi sự kiện (dùng để đo và kiểm tra trên Linux không màn hình)."""
+    name = "recording"
+
+    def __init__(self, ledger=None):
+        self.clear()
+
+    def clear(self):
+        self.events = []  # 'backspace' hoặc từng ký tự, đúng thứ tự gửi
+        self.calls = 0
+
+    def emit(self, backspaces, text):
+        self.calls += 1
+        self.events.extend(['backspace'] * backspaces)
+        self.events.extend(text)
+
+def _load_send_input():
+    """Dựng hàm gửi (số phím xóa, chữ) bằng một lệnh SendInput; None nếu không nạp được user32."""
+    try:
+        import ctypes
+        from ctypes import wintypes
+        user32 = ctypes.WinDLL('user32', use_last_error=True)
+    except (ImportError, OSError, AttributeError):
+        return None
+
+    class KEYBDINPUT(ctypes.Structure):
+        _fields_ = (("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD),
+                    ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.c_size_t))
+
+    class MOUSEINPUT(ctypes.Structure):  # chỉ để union có đúng kích thước INPUT
+        _fields_ = (("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD),
+                    ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.c_size_t))
+
+    class _INPUTUNION(ctypes.Union):
+        _fields_ = (("ki", KEYBDINPUT), ("mi", MOUSEINPUT))
+
+    class INPUT(ctypes.Structure):
+        _fields_ = (("type", wintypes.DWORD), ("union", _INPUTUNION))
+
+    INPUT_KEYBOARD, KEYEVENTF_KEYUP, KEYEVENTF_UNICODE, VK_BACK = 1, 0x0002, 0x0004, 0x08
+
+    def send_input(backspaces, text):
+        units = text.encode('utf-16-le')
+        code_units = [int.from_bytes(units[i:i + 2], 'little') for i in range(0, len(units), 2)]
+        inputs = (INPUT * (2 * (backspaces + len(code_units))))()
+        i = 0
+        for _ in range(backspaces):
+            for flags in (0, KEYEVENTF_KEYUP):
+                inputs[i].type = INPUT_KEYBOARD
+                inputs[i].union.ki = KEYBDINPUT(VK_BACK, 0, flags, 0, 0)
+                i += 1
+        for unit in code_units:
+            for flags in (KEYEVENTF_UNICODE, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP):
+                inputs[i].type = INPUT_KEYBOARD
+                inputs[i].union.ki = KEYBDINPUT(0, unit, flags, 0, 0)
+                i += 1
+        if i and user32.SendInput(i, inputs, ctypes.sizeof(INPUT)) != i:
+            print(f"SendInput failed: {ctypes.get_last_error()}")
+
+    return send_input
+
+EMITTERS = {cls.name: cls for cls in (KeyboardEmitter, BatchedEmitter, RecordingEmitter)}
+
+# --- Hook bàn phím: phím bổ trợ, ghi phím, đo độ trễ và phiên gõ ---
+class ModifierTracker:
+    """
+    Theo dõi phím bổ trợ (Ctrl/Alt/Shift/Windows) từ chính luồng sự kiện nhấn/nhả, thay cho việc gọi
+    keyboard.is_pressed() trong hook. feed() nhận tên phím dạng chuỗi nên có thể chạy với chuỗi sự kiện
+    giả lập, không cần bàn phím thật. Phím khóa (Caps/Num/Scroll Lock) được bỏ qua, không ngắt từ.
+    """
+    IGNORE, RESET, KEY, REPEAT = 0, 1, 2, 3
+    MODIFIERS = {'ctrl': 'ctrl', 'control': 'ctrl', 'alt': 'alt', 'option': 'alt', 'alt gr': 'alt gr',
+                 'shift': 'shift', 'windows': 'windows', 'command': 'windows', 'cmd': 'windows'}
+    CHORD_MODIFIERS = ('ctrl', 'alt', 'windows')  # Shift và AltGr vẫn gõ ra chữ
+    LOCKS = ('caps lock', 'num lock', 'scroll lock')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._held = {modifier: set() for modifier in set(self.MODIFIERS.values())}
+        self._held_keys = set()  # phím chữ đang giữ, để nhận ra sự kiện lặp khi giữ phím
+
+    def is_pressed(self, modifier) -> bool:
+        return bool(self._held[modifier])
+
+    @property
+    def chord(self) -> bool:
+        held = self._held
+        return bool(held['ctrl'] or held['alt'] or held['windows'])
+
+    def feed(self, event_type, name):
+        """Cập nhật trạng thái theo một sự kiện và cho biết bộ gõ cần làm gì: IGNORE, RESET, KEY hoặc REPEAT."""
+        is_down = event_type == KEY_DOWN
+        if not name:
+            return self.RESET if is_down else self.IGNORE
+        base = name[5:] if name.startswith('left ') else name[6:] if name.startswith('right ') else name
+        modifier = self.MODIFIERS.get(base)
+        if modifier is not None:
+            if is_down: self._held[modifier].add(name)
+            else: self._held[modifier].discard(name)
+            return self.IGNORE
+        if name in self.LOCKS:
+            return self.IGNORE
+        if not is_down:
+            if len(name) == 1: self._held_keys.discard(name.lower())
+            return self.IGNORE
+        if self.chord:  # phím tắt (Ctrl+C, Alt+Tab, Ctrl+Backspace...) làm con trỏ/cửa sổ thay đổi
+            return self.RESET
+        if len(name) == 1:
+            key = name.lower()
+            if key in self._held_keys:
+                return self.REPEAT  # nhấn lần nữa khi chưa nhả: lặp phím do giữ
+            self._held_keys.add(key)
+            return self.KEY
+        if name in ('backspace', 'space'):
+            return self.KEY
+        return self.RESET  # enter/tab, phím điều hướng, Esc, F1...: ngắt từ
+
+# === GHI PHÍM ĐỂ PHÁT LẠI (tùy chọn) ===
+# File: header (magic, phiên bản, thời điểm bắt đầu ns), rồi mỗi sự kiện gồm khoảng cách thời gian
+# tới sự kiện trước (µs), cờ (bit 0: nhả phím) và tên phím UTF-8 có độ dài đứng trước.
+KEYSTROKE_LOG_MAGIC = b"VPKL"
+KEYSTROKE_LOG_VERSION = 1
+KEYSTROKE_LOG_HEADER = struct.Struct("<4sHHQ")
+KEYSTROKE_LOG_RECORD = struct.Struct("<IBB")
+KEYSTROKE_LOG_KEY_UP = 1
+
+class KeystrokeRecorder:
+    """
+    Ghi các sự kiện phím thật (đã lọc phím tự gửi) vào file nhị phân. record() chạy trên luồng hook nên
+    chỉ lấy thời điểm rồi đưa vào hàng đợi; luồng ghi riêng đóng gói, gom trong bộ nhớ rồi ghi theo khối
+    (hoặc sau FLUSH_INTERVAL_S không có phím mới).
+    """
+    FLUSH_BYTES = 64 * 1024
+    FLUSH_INTERVAL_S = 1.0
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(KEYSTROKE_LOG_HEADER.pack(KEYSTROKE_LOG_MAGIC, KEYSTROKE_LOG_VERSION, 0, time.time_ns()))
+        self._queue = queue.SimpleQueue()
+        self.events = 0
+        self._thread = threading.Thread(target=self._run, args=(time.perf_counter_ns(),),
+                                        name="VietPyTelexKeyLog", daemon=True)
+        self._thread.start()
+
+    def record(self, event_type, name):
+        self._queue.put((time.perf_counter_ns(), event_type, name))
+        self.events += 1
+
+    def _run(self, last_ns):
+        buffer = bytearray()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.FLUSH_INTERVAL_S)
+            except queue.Empty:
+                item = ()  # rảnh: ghi phần đang gom
+            if item:
+                now, event_type, name = item
+                delta_us = min((now - last_ns) // 1000, 0xFFFFFFFF)
+                last_ns = now
+                data = (name or '').encode('utf-8')[:255]
+                flags = 0 if event_type == KEY_DOWN else KEYSTROKE_LOG_KEY_UP
+                buffer += KEYSTROKE_LOG_RECORD.pack(delta_us, flags, len(data))
+                buffer += data
+                if len(buffer) < self.FLUSH_BYTES: continue
+            if buffer:
+                self._file.write(buffer)
+                self._file.flush()
+                buffer.clear()
+            if item is None: return
+
+    def close(self):
+        """Ghi nốt các sự kiện đang chờ rồi đóng file."""
+        if self._file:
+            self._queue.put(None)
+            self._thread.join()
+            self._file.close()
+            self._file = None
+
+def read_keystroke_log(path):
+    """Đọc file ghi phím: trả về (thời điểm bắt đầu ns, danh sách (khoảng cách µs, loại sự kiện, tên phím))."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, _, started_ns = KEYSTROKE_LOG_HEADER.unpack_from(data, 0)
+    if magic != KEYSTROKE_LOG_MAGIC or version != KEYSTROKE_LOG_VERSION:
+        raise ValueError(f"{path} is not a keystroke log")
+    events = []
+    offset = KEYSTROKE_LOG_HEADER.size
+    while offset + KEYSTROKE_LOG_RECORD.size <= len(data):
+        delta_us, flags, length = KEYSTROKE_LOG_RECORD.unpack_from(data, offset)
+        offset += KEYSTROKE_LOG_RECORD.size
+        name = data[offset:offset + length].decode('utf-8')
+        offset += length
+        event_type = KEY_UP if flags & KEYSTROKE_LOG_KEY_UP else KEY_DOWN
+        events.append((delta_us, event_type, name))
+    return started_ns, events
+
+class LatencyHistogram:
+    """
+    Histogram độ trễ với các ngăn cố định theo lũy thừa 2 (ngăn i chứa giá trị < 1024 * 2**i ns,
+    tức từ ~1 µs tới ~1 s). Ghi một mẫu chỉ là một phép bit_length và một phép cộng mảng,
+    đủ nhẹ để luôn bật.
+    """
+    BUCKETS = 21
+    _SHIFT = 10  # ngăn đầu tiên: < 1024 ns
+
+    def __init__(self):
+        self.counts = array('Q', [0]) * self.BUCKETS
+        self.count = self.total_ns = self.max_ns = 0
+
+    def record(self, ns):
+        bucket = ns.bit_length() - self._SHIFT
+        self.counts[0 if bucket < 0 else bucket if bucket < self.BUCKETS else self.BUCKETS - 1] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns: self.max_ns = ns
+
+    def percentile(self, fraction):
+        """Cận trên (ns) của ngăn chứa phân vị `fraction`; 0 nếu chưa có mẫu."""
+        if not self.count: return 0
+        rank = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(1 << (i + self._SHIFT), self.max_ns)
+        return self.max_ns
+
+    def to_dict(self):
+        return {"count": self.count, "mean_ns": self.total_ns // self.count if self.count else 0,
+                "p50_ns": self.percentile(0.5), "p99_ns": self.percentile(0.99), "max_ns": self.max_ns,
+                "bucket_upper_ns": [1 << (i + self._SHIFT) for i in range(self.BUCKETS)],
+                "buckets": list(self.counts)}
+
+class TelexMetrics:
+    """
+    Histogram độ trễ (bộ quy tắc, gửi phím, chờ trong hàng đợi, từ lúc nhấn tới khi gửi xong, từ lúc nhấn
+    phím tắt/khay tới khi bật/tắt xong), bộ đếm và số lần trúng/trượt của TelexCache (nếu có) của phiên.
+    "toggle" do luồng GUI ghi, các histogram còn lại do luồng xử lý ghi.
+    """
+    HISTOGRAMS = ("engine", "emission", "queue_wait", "end_to_end", "toggle")
+    COUNTERS = ("keys", "transforms", "backspaces", "resets")
+
+    def __init__(self, cache=None):
+        for name in self.HISTOGRAMS: setattr(self, name, LatencyHistogram())
+        for name in self.COUNTERS: setattr(self, name, 0)
+        self.cache = cache
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.COUNTERS}
+        data.update({name: getattr(self, name).to_dict() for name in self.HISTOGRAMS})
+        if self.cache is not None: data["cache"] = self.cache.stats()
+        return data
+
+    def summary(self):
+        """Vài dòng tóm tắt để hiển thị trong cửa sổ cài đặt."""
+        lines = [f"Phím: {self.keys}  Đổi chữ: {self.transforms}  Xóa: {self.backspaces}  Ngắt từ: {self.resets}"]
+        for name in self.HISTOGRAMS:
+            histogram = getattr(self, name)
+            if name == "toggle" and not histogram.count: continue  # chế độ không có phím tắt/khay (replay, headless)
+            lines.append(f"{name}: p50 {histogram.percentile(0.5) / 1000:.0f} µs, "
+                         f"p99 {histogram.percentile(0.99) / 1000:.0f} µs, max {histogram.max_ns / 1000:.0f} µs")
+        if self.cache is not None: lines.append(self.cache.summary())
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            import json
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=4)
+
+def peak_memory_kb():
+    """Bộ nhớ thường trú cao nhất của tiến trình (KB), None nếu không đo được."""
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+        except ImportError:
+            return None
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+                       [(name, ctypes.c_size_t) for name in (
+                           "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                           "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        try:
+            kernel32 = ctypes.WinDLL('kernel32')
+            kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+            kernel32.K32GetProcessMemoryInfo.argtypes = (wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD)
+            if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+                return None
+        except (OSError, AttributeError):
+            return None
+        return counters.PeakWorkingSetSize // 1024
+    # Linux: ru_maxrss được giữ qua fork/exec (tiến trình con báo cả đỉnh của tiến trình cha), VmHWM thì không
+    try:
+        with open("/proc/self/status", 'rb') as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS tính bằng byte, Linux bằng KB
+
+class LatencyWatchdog:
+    """
+    Đo thời gian mỗi loạt phím (bộ quy tắc + gửi phím) so với ngân sách. Vượt ngân sách `strikes` lần
+    trong `window_s` giây thì bật chế độ cho qua (không chạy bộ gõ) trong `cooldown_s` giây và ghi lại
+    sự cố, để một tương tác xấu (từ bệnh lý, cửa sổ đích bị treo...) không làm đơ bàn phím.
+    """
+    MAX_INCIDENTS = 20
+
+    def __init__(self, budget_ms=5, strikes=3, window_s=10, cooldown_s=30):
+        self.budget_ns = int(budget_ms * 1_000_000)
+        self.strikes = max(1, int(strikes))
+        self.window_ns = int(window_s * 1_000_000_000)
+        self.cooldown_ns = int(cooldown_s * 1_000_000_000)
+        self._breaches = deque()
+        self.passthrough_until = 0
+        self.breaches = 0
+        self.incidents = deque(maxlen=self.MAX_INCIDENTS)
+
+    def active(self, now) -> bool:
+        return now < self.passthrough_until
+
+    def check(self, started, finished, keys, word=""):
+        """Ghi nhận một loạt phím vừa xử lý; trả về bản ghi sự cố nếu vừa chuyển sang cho qua, ngược lại None."""
+        elapsed = finished - started
+        if elapsed <= self.budget_ns:
+            return None
+        self.breaches += 1
+        breaches = self._breaches
+        breaches.append(finished)
+        while finished - breaches[0] > self.window_ns:
+            breaches.popleft()
+        if len(breaches) < self.strikes:
+            return None
+        breaches.clear()
+        self.passthrough_until = finished + self.cooldown_ns
+        incident = {"time": time.time(), "elapsed_ms": elapsed / 1e6, "budget_ms": self.budget_ns / 1e6,
+                    "keys": describe_keys(keys), "word": word, "cooldown_s": self.cooldown_ns / 1e9}
+        self.incidents.append(incident)
+        return incident
+
+def describe_keys(keys):
+    """Chuỗi phím dễ đọc cho thông báo: phím chữ giữ nguyên, phím khác trong <...>."""
+    return ''.join(key_name if key_name and len(key_name) == 1 else f"<{key_name or 'break'}>"
+                   for key_name, _ in keys)
+
+class TelexSession:
+    """
+    Một phiên gõ Telex độc lập: âm tiết đang gõ, trạng thái bật/tắt, bộ gửi phím, hàng đợi và
+    luồng xử lý riêng, nên một tiến trình có thể chạy nhiều phiên (nhúng, máy chủ...).
+    Hợp đồng luồng: luồng xử lý của phiên là chủ duy nhất của âm tiết, trạng thái bật/tắt và
+    bộ gửi phím. Hook, GUI và khay hệ thống chỉ gửi thông điệp vào hàng đợi (on_key_event,
+    set_enabled, reset, set_emitter, set_cache_size), thông điệp được áp dụng đúng thứ tự với các phím.
+    `on_incident` (nếu có) được gọi trên luồng xử lý khi watchdog chuyển sang cho qua.
+    Với install_hook=False phiên không gắn hook hệ thống; sự kiện được đưa vào bằng on_key_event
+    (vd: replay_telex.py phát lại file ghi phím trên Linux không màn hình).
+    ModifierTracker và việc khớp sổ phím tự gửi chạy trên luồng hook.
+    Dùng chung giữa các phiên chỉ có các bảng quy tắc bất biến và syllable_table (chỉ đọc, có khóa);
+    TelexCache là của riêng từng phiên, không khóa vì chỉ luồng xử lý dùng.
+    """
+    __slots__ = ('syllable', 'cache', 'tracker', 'ledger', 'emitter', 'enabled', 'watchdog', 'on_incident', 'metrics',
+                 'recorder', 'install_hook', '_hook', '_queue', '_thread', '_passthrough',
+                 'processed', 'batches', 'coalesced', 'last_wait_ns', 'max_wait_ns', 'total_wait_ns')
+    MSG_KEY, MSG_ENABLE, MSG_RESET, MSG_EMITTER, MSG_CACHE, MSG_STOP = range(6)
+
+    def __init__(self, emitter_name="keyboard", watchdog=None, install_hook=True, cache_size=0):
+        self.cache = TelexCache(cache_size)
+        self.syllable = SyllableState(self.cache)
+        self.tracker = ModifierTracker()
+        self.ledger = InjectionLedger()
+        self.emitter = self._make_emitter(emitter_name)
+        self.enabled = False
+        self.watchdog = watchdog or LatencyWatchdog()
+        self.metrics = TelexMetrics(self.cache)
+        self.on_incident = None
+        self.recorder = None  # KeystrokeRecorder, chỉ bật khi cấu hình keystroke_log
+        self.install_hook = install_hook
+        self._hook = None
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._passthrough = False
+        self.processed = self.batches = self.coalesced = 0
+        self.last_wait_ns = self.max_wait_ns = self.total_wait_ns = 0
+
+    def _make_emitter(self, name):
+        if name not in EMITTERS:
+            print(f"Unknown emitter '{name}'. Using keyboard.")
+            name = KeyboardEmitter.name
+        return EMITTERS[name](self.ledger)
+
+    # --- Thông điệp (gọi từ mọi luồng) ---
+    def _post(self, kind, payload=None):
+        self._queue.put((kind, payload, time.perf_counter_ns()))
+
+    def set_enabled(self, enabled):
+        """Bật/tắt bộ gõ: gắn/gỡ hook ở luồng gọi, trạng thái được luồng xử lý áp dụng theo thứ tự."""
+        self._start_worker()
+        if enabled and self._hook is None and self.install_hook:
+            self.tracker.reset()
+            self._hook = _load_keyboard().hook(self.on_key_event, suppress=False)
+            print("Keyboard listener started.")
+        self._post(self.MSG_ENABLE, enabled)
+        if not enabled and self._hook is not None:
+            _load_keyboard().unhook(self._hook)
+            self._hook = None
+            print("Keyboard listener stopped.")
+
+    def reset(self):
+        self._post(self.MSG_RESET)
+
+    def set_emitter(self, name):
+        self._post(self.MSG_EMITTER, name)
+
+    def set_cache_size(self, size):
+        self._post(self.MSG_CACHE, size)
+
+    def close(self, timeout=1.0):
+        """Gỡ hook, xử lý nốt các phím đang chờ rồi dừng luồng xử lý."""
+        if self._hook is not None:
+            _load_keyboard().unhook(self._hook)
+            self._hook = None
+        if self._thread is not None:
+            self._post(self.MSG_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def on_key_event(self, e):
+        """Callback của hook: cập nhật trạng thái phím bổ trợ rồi đưa phím vào hàng đợi, không chạy bộ gõ trong hook."""
+        if e.event_type == KEY_DOWN:
+            if self.ledger.match(e.name):
+                return False  # phím do chính chương trình gửi, đã có trong sổ
+        elif self.ledger.match_up(e.name):
+            return False  # lần nhả của phím tự gửi
+        if self.recorder is not None:
+            self.recorder.record(e.event_type, e.name)
+        action = self.tracker.feed(e.event_type, e.name)
+        if action == ModifierTracker.IGNORE: return False
+        if action == ModifierTracker.RESET:
+            self._post(self.MSG_KEY, (None, False))
+        else:
+            # Phím lặp do giữ mà không kích hoạt quy tắc nào: cho qua, không chạy bộ quy tắc
+            self._post(self.MSG_KEY, (e.name, action == ModifierTracker.REPEAT and e.name not in KEY_CLASSES))
+        return False
+
+    # --- Luồng xử lý ---
+    def _start_worker(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="VietPyTelexKeys", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            messages = [self._queue.get()]
+            while True:  # lấy luôn các thông điệp đang chờ để xử lý phím chung một loạt
+                try:
+                    messages.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            keys, stamps = [], []
+            for kind, payload, queued_at in messages:
+                if kind == self.MSG_KEY:
+                    self._record_wait(queued_at)
+                    if self.enabled:
+                        keys.append(payload)
+                        if payload[0] is not None:  # dấu ngắt từ không phải phím gõ, không đo độ trễ
+                            stamps.append(queued_at)
+                    continue
+                self._flush(keys, stamps)
+                if kind == self.MSG_STOP:
+                    return
+                if kind == self.MSG_ENABLE:
+                    self.enabled = payload
+                    self.syllable.reset()
+                    self.metrics.resets += 1
+                elif kind == self.MSG_RESET:
+                    self.syllable.reset()
+                    self.metrics.resets += 1
+                elif kind == self.MSG_EMITTER and payload != self.emitter.name:
+                    self.emitter = self._make_emitter(payload)
+                elif kind == self.MSG_CACHE:
+                    self.cache.resize(payload)
+            self._flush(keys, stamps)
+
+    def _flush(self, keys, stamps):
+        if not keys: return
+        started = time.perf_counter_ns()
+        if self.watchdog.active(started):
+            self._passthrough = True  # đang cho qua: phím tới thẳng ứng dụng, không chạy bộ gõ
+            keys.clear()
+            stamps.clear()
+            return
+        if self._passthrough:
+            # Hết thời gian cho qua: từ đang gõ dở không được theo dõi, để nguyên tới khi ngắt từ
+            self._passthrough = False
+            self.syllable.reset()
+            self.syllable.pass_through()
+        self.batches += 1
+        if len(keys) > 1: self.coalesced += len(keys)
+        try:
+            self.process_keys(keys)
+        except Exception as e:  # lỗi ở một loạt phím không được làm chết luồng xử lý
+            print(f"Error processing keys {[key_name for key_name, _ in keys]!r}: {e}")
+        finished = time.perf_counter_ns()
+        end_to_end = self.metrics.end_to_end
+        for queued_at in stamps:
+            end_to_end.record(finished - queued_at)
+        incident = self.watchdog.check(started, finished, keys, self.syllable.word)
+        keys.clear()
+        stamps.clear()
+        if incident is not None:
+            print(f"Latency budget exceeded ({incident['elapsed_ms']:.1f} ms on {incident['keys']!r} "
+                  f"in {incident['word']!r}). "
+                  f"Passing keys through for {incident['cooldown_s']:.0f}s.")
+            if self.on_incident is not None:
+                self.on_incident(incident)
+
+    def _record_wait(self, queued_at):
+        wait_ns = time.perf_counter_ns() - queued_at
+        self.metrics.queue_wait.record(wait_ns)
+        self.processed += 1
+        self.last_wait_ns = wait_ns
+        self.total_wait_ns += wait_ns
+        if wait_ns > self.max_wait_ns: self.max_wait_ns = wait_ns
+
+    def process_keys(self, keys):
+        """
+        Chạy bộ gõ cho một loạt phím lấy ra cùng lúc từ hàng đợi, mỗi phím là (tên phím hoặc None khi
+        ngắt từ, có phải phím lặp cần cho qua). Các phím thật đã tới ứng dụng trước khi được xử lý, nên
+        giữ mô hình màn hình: `typed` là chữ ứng dụng đang hiển thị tính từ đầu từ hiện tại, `target`
+        là chữ bộ gõ muốn hiển thị, rồi gửi một lần thay đổi ròng duy nhất ở cuối loạt phím.
+        Chỉ gọi trực tiếp từ luồng xử lý của phiên, hoặc khi phiên không chạy luồng (vd: đo đạc).
+        Trả về True nếu đã gửi phím thay thế.
+        """
+        started = time.perf_counter_ns()
+        metrics = self.metrics
+        metrics.keys += sum(key_name is not None for key_name, _ in keys)
+        syllable = self.syllable
+        # Các ký tự đã cho qua (overflow) không được lưu, chỉ cần giữ chỗ để phím xóa khớp vị trí
+        typed = target = syllable.word + '\0' * syllable.overflow
+        typed_cut = target_cut = 0  # số ký tự bị xóa lấn sang trước đầu mô hình
+        for key_name, is_repeat in keys:
+            if key_name is None:
+                # Enter/Tab/phím tắt đã tới ứng dụng: sửa chữ lúc này có thể xóa nhầm, bỏ phần chưa gửi
+                syllable.reset()
+                metrics.resets += 1
+                typed = target = ""
+            elif key_name == 'space':
+                # Transformations happen live, không cần biến đổi lại khi ngắt từ.
+                syllable.reset()
+                metrics.resets += 1
+                typed += ' '
+                target += ' '
+            elif key_name == 'backspace':
+                if typed: typed = typed[:-1]
+                else: typed_cut += 1
+                if syllable.passthrough:
+                    syllable.pop()
+                    target = target[:-1]
+                elif syllable.word:
+                    old_word = syllable.word
+                    syllable.pop()
+                    target = target[:len(target) - len(old_word)] + syllable.word
+                elif target:
+                    target = target[:-1]
+                else:
+                    target_cut += 1
+            else:
+                typed += key_name
+                if is_repeat:
+                    syllable.pass_through()
+                if syllable.passthrough:
+                    syllable.append(key_name)
+                    target += key_name
+                    continue
+                old_word = syllable.word
+                if key_name in KEY_CLASSES:
+                    syllable.push(key_name)
+                else:
+                    # Đường tắt: phím không bao giờ kích hoạt quy tắc, chỉ thêm vào buffer
+                    syllable.append(key_name)
+                if syllable.passthrough:  # phím này làm từ vượt MAX_SYLLABLE_LENGTH
+                    target += key_name
+                else:
+                    target = target[:len(target) - len(old_word)] + syllable.word
+        emit_started = time.perf_counter_ns()
+        metrics.engine.record(emit_started - started)
+        if typed == target and typed_cut == target_cut:
+            return False
+        if typed_cut < target_cut:
+            # Bộ gõ muốn xóa thêm ký tự trước đầu mô hình (vd: phím 'z' đã bị nuốt rồi mới xóa lùi)
+            typed = '\0' * (target_cut - typed_cut) + typed
+        # typed_cut > target_cut: phím xóa thật đã xóa chữ nằm ngoài mô hình, không khôi phục được
+        common = common_prefix_length(typed, target)
+        self.emitter.emit(len(typed) - common, target[common:])
+        metrics.emission.record(time.perf_counter_ns() - emit_started)
+        metrics.transforms += 1
+        metrics.backspaces += len(typed) - common
+        return True
+
+    def process_key(self, key_name, is_repeat=False):
+        """Chạy bộ gõ cho một phím (None = ngắt từ). Trả về True nếu đã gửi phím thay thế."""
+        return self.process_keys(((key_name, is_repeat),))
+
+    def stats(self):
+        mean_wait_ns = self.total_wait_ns // self.processed if self.processed else 0
+        return {"depth": self.depth, "processed": self.processed, "batches": self.batches,
+                "coalesced": self.coalesced, "last_wait_ns": self.last_wait_ns,
+                "mean_wait_ns": mean_wait_ns, "max_wait_ns": self.max_wait_ns,
+                "budget_breaches": self.watchdog.breaches, "incidents": list(self.watchdog.incidents),
+                "injected": self.ledger.stats(), "metrics": self.metrics.to_dict()}
@@ -4,21 +4,16 @@
 
 import sys
 import os
-import json
 import platform
-import keyboard
-import winsound
-from PyQt6.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLabel, QSystemTrayIcon, QMenu, QFileDialog,
-    QMessageBox, QCheckBox, QDialog, QGridLayout, QRadioButton, QGroupBox
-)
-from PyQt6.QtGui import QIcon, QAction, QPixmap, QFont, QCloseEvent, QPainter, QColor, QActionGroup
-from PyQt6.QtCore import Qt, QCoreApplication
+import time
+import queue
+import threading
+STARTED_AT = time.perf_counter()
 from typing import Optional
 from shutil import copy2
+from vietpy_telex_instance import SingleInstance, command_from_argv
 
-# --- Cấu hình mặc định (GIỮ NGUYÊN) ---
+# --- Cấu hình mặc định ---
 if platform.system() == "Windows":
     base_config_dir = os.getenv('APPDATA', os.path.expanduser('~'))
     CONFIG_DIR = os.path.join(base_config_dir, 'VietPyTelex')
@@ -26,9 +21,16 @@ elif platform.system() == "Darwin": # macOS
     CONFIG_DIR = os.path.join(os.path.expanduser("~/Library/Application Support"), 'VietPyTelex')
 else: # Linux và các OS khác
     CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".config", 'VietPyTelex')
-os.makedirs(CONFIG_DIR, exist_ok=True)
+
+# Lần chạy thứ hai chỉ gửi lệnh (show/toggle/quit) cho bản đang chạy rồi thoát, trước khi nạp Qt và bộ gõ
+single_instance = SingleInstance(CONFIG_DIR)
+if __name__ == "__main__" and not single_instance.acquire():
+    sys.exit(single_instance.send(command_from_argv(sys.argv)))
+
+from vietpy_telex_core import KeystrokeRecorder, LatencyWatchdog, TelexMetrics, TelexSession, peak_memory_kb
+from vietpy_telex_config import ConfigStore
+
 SOUNDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sounds')
-os.makedirs(SOUNDS_DIR, exist_ok=True)
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
 DEFAULT_CONFIG = { 
     "enabled": False, 
@@ -38,296 +40,42 @@ DEFAULT_CONFIG = {
     "silent_start": False,
     "sound_enabled": True,
     "sound_file": "default.wav",
-    "custom_sound_file": ""
+    "custom_sound_file": "",
+    "telex_cache_size": 0,  # 0 = tắt bộ nhớ đệm apply_word_telex
+    "emitter": "keyboard",  # keyboard | batched | recording (không gửi phím, chỉ ghi lại)
+    "latency_budget_ms": 5,  # thời gian tối đa cho một loạt phím (bộ quy tắc + gửi phím)
+    "latency_strikes": 3,  # số lần vượt ngân sách trong latency_window_s thì chuyển sang cho qua
+    "latency_window_s": 10,
+    "latency_cooldown_s": 30,  # thời gian cho qua trước khi tự bật lại bộ gõ
+    "keystroke_log": ""  # đường dẫn file ghi phím để phát lại (replay_telex.py); "" = tắt
 }
 
-# --- Biến toàn cục (GIỮ NGUYÊN) ---
-config = DEFAULT_CONFIG.copy()
-is_telex_enabled = False
-keyboard_hook = None
-current_word_buffer = ""
-active_hotkey_hook = None
+# --- Cấu hình dùng chung (ConfigStore, ghi xuống file ở luồng nền) ---
+config = ConfigStore(CONFIG_FILE, DEFAULT_CONFIG)
 
-# --- Hàm tải và lưu cấu hình (GIỮ NGUYÊN) ---
+# --- Hàm tải và lưu cấu hình ---
 def load_config():
-    global config
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f: config.update(json.load(f))
-        except (json.JSONDecodeError, IOError) as e: print(f"Error loading config: {e}. Using default.")
-    else: print("Config file not found. Using default config.")
+    config.load()
 
 def save_config():
-    try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f: json.dump(config, f, ensure_ascii=False, indent=4)
-    except IOError as e: print(f"Error saving config: {e}")
-
-# --- Telex core (CẬP NHẬT) ---
-
-# CHAR_MAP, TONE_REMOVE_MAP, HAT_REMOVE_MAP, ACCENT_MARKS (GIỮ NGUYÊN)
-CHAR_MAP = {
-    'a': {'s': 'á', 'f': 'à', 'r': 'ả', 'x': 'ã', 'j': 'ạ', 'w': 'ă', 'aa': 'â'}, 'ă': {'s': 'ắ', 'f': 'ằ', 'r': 'ẳ', 'x': 'ẵ', 'j': 'ặ'},
-    'â': {'s': 'ấ', 'f': 'ầ', 'r': 'ẩ', 'x': 'ẫ', 'j': 'ậ'}, 'e': {'s': 'é', 'f': 'è', 'r': 'ẻ', 'x': 'ẽ', 'j': 'ẹ', 'ee': 'ê'},
-    'ê': {'s': 'ế', 'f': 'ề', 'r': 'ể', 'x': 'ễ', 'j': 'ệ'}, 'i': {'s': 'í', 'f': 'ì', 'r': 'ỉ', 'x': 'ĩ', 'j': 'ị'},
-    'o': {'s': 'ó', 'f': 'ò', 'r': 'ỏ', 'x': 'õ', 'j': 'ọ', 'w': 'ơ', 'oo': 'ô'}, 'ơ': {'s': 'ớ', 'f': 'ờ', 'r': 'ở', 'x': 'ỡ', 'j': 'ợ'},
-    'ô': {'s': 'ố', 'f': 'ồ', 'r': 'ổ', 'x': 'ỗ', 'j': 'ộ'}, 'u': {'s': 'ú', 'f': 'ù', 'r': 'ủ', 'x': 'ũ', 'j': 'ụ', 'w': 'ư'},
-    'ư': {'s': 'ứ', 'f': 'ừ', 'r': 'ử', 'x': 'ữ', 'j': 'ự'}, 'y': {'s': 'ý', 'f': 'ỳ', 'r': 'ỷ', 'x': 'ỹ', 'j': 'ỵ'},
-    'd': {'d': 'đ'}, 'uo': {'w': 'ươ'}, 'ia': {'w': 'ưa'}, 'uy': {'s': 'úy', 'f': 'ùy', 'r': 'ủy', 'x': 'ũy', 'j': 'ụy'},
-    'uyê': {'s': 'uyế', 'f': 'uyề', 'r': 'uyể', 'x': 'uyễ', 'j': 'uyệ'}, 'oai': {'s': 'oái', 'f': 'oài', 'r': 'oải', 'x': 'oãi', 'j': 'oại'},
-    'uay': {'s': 'uáy', 'f': 'uày', 'r': 'uảy', 'x': 'uãy', 'j': 'uạy'},
-}
-TONE_REMOVE_MAP = {
-    'á': 'a', 'à': 'a', 'ả': 'a', 'ã': 'a', 'ạ': 'a', 'ắ': 'ă', 'ằ': 'ă', 'ẳ': 'ă', 'ẵ': 'ă', 'ặ': 'ă',
-    'ấ': 'â', 'ầ': 'â', 'ẩ': 'â', 'ẫ': 'â', 'ậ': 'â', 'é': 'e', 'è': 'e', 'ẻ': 'e', 'ẽ': 'e', 'ẹ': 'e',
-    'ế': 'ê', 'ề': 'ê', 'ể': 'ê', 'ễ': 'ê', 'ệ': 'ê', 'í': 'i', 'ì': 'i', 'ỉ': 'i', 'ĩ': 'i', 'ị': 'i',
-    'ó': 'o', 'ò': 'o', 'ỏ': 'o', 'õ': 'o', 'ọ': 'o', 'ớ': 'ơ', 'ờ': 'ơ', 'ở': 'ơ', 'ỡ': 'ơ', 'ợ': 'ơ',
-    'ố': 'ô', 'ồ': 'ô', 'ổ': 'ô', 'ỗ': 'ô', 'ộ': 'ô', 'ú': 'u', 'ù': 'u', 'ủ': 'u', 'ũ': 'u', 'ụ': 'u',
-    'ứ': 'ư', 'ừ': 'ư', 'ử': 'ư', 'ữ': 'ư', 'ự': 'ư', 'ý': 'y', 'ỳ': 'y', 'ỷ': 'y', 'ỹ': 'y', 'ỵ': 'y',
-}
-HAT_REMOVE_MAP = {'ă': 'a', 'â': 'a', 'ê': 'e', 'ô': 'o', 'ơ': 'o', 'ư': 'u', 'đ': 'd'}
-ACCENT_MARKS = ['s', 'f', 'r', 'x', 'j']
-
-# === CÁC HẰNG SỐ MỚI ĐỂ XÁC ĐỊNH VỊ TRÍ ĐẶT DẤU CHUẨN ===
-VOWELS_WITH_HAT_OR_HOOK = "ăâêôơư"
-VOWELS_PLAIN = "aeiouy"
-
-# Danh sách các cụm nguyên âm và vị trí ưu tiên đặt dấu (index tương đối từ đầu cụm)
-# Sắp xếp từ dài nhất đến ngắn nhất để đảm bảo `uyê` được xử lý trước `yê`.
-VOWEL_CLUSTERS_ACCENT_PRIORITY = [
-    # Cụm 3 chữ
-    ("uyê", 2),  # khuy**ế**n
-    ("oai", 1),  # h**oà**i
-    ("uay", 1),  # kh**uấ**y
-    ("oay", 1),  # x**oá**y
-    ("iêu", 1),  # h**iế**u
-    ("yêu", 1),  # **yế**u
-    ("ươi", 2),  # t**ưởi**
-    ("uôi", 2),  # c**uối**
-    ("ươu", 2),  # h**ượu**
-
-    # Cụm 2 chữ (quan trọng nhất để sửa lỗi)
-    ("qu", -1),  # 'qu' là một cụm phụ âm-nguyên âm đặc biệt, dấu luôn đặt ở nguyên âm sau nó
-    ("gi", -1),  # Tương tự 'qu', dấu đặt ở nguyên âm sau 'i'
-    
-    ("ia", 0),   # ngh**ĩ**a
-    ("yê", 1),   # y**ế**n
-    ("iê", 1),   # t**iế**ng
-    ("ua", 0),   # m**ú**a
-    ("uô", 1),   # m**uố**n
-    ("ưa", 0),   # m**ư**a
-    ("ươ", 1),   # m**ướ**n
-    
-    ("ai", 0),   # l**ạ**i
-    ("ao", 0),   # l**à**o
-    ("au", 0),   # s**á**u
-    ("ay", 0),   # g**ầ**y
-    
-    ("ei", 0),   # (ít dùng)
-    ("eo", 0),   # k**é**o
-    ("eu", 0),   # tr**é**o
-    
-    ("oi", 0),   # t**ô**i
-    ("oa", 0),   # h**ò**a
-    ("oe", 0),   # l**o**e
-    ("oy", 0),   # (ít dùng)
-    
-    ("ui", 0),   # t**ú**i
-    ("uy", 1),   # q**uý**nh
-    ("uu", 0),   # (ít dùng)
-    
-    ("iu", 0),   # r**ì**u
-]
+    """Không chặn: luồng ghi của ConfigStore gộp các thay đổi rồi ghi nguyên tử; config.flush() khi thoát."""
+    config.save()
 
-# === HÀM find_main_vowel_position ĐÃ ĐƯỢC VIẾT LẠI HOÀN TOÀN ===
-# === HÀM find_main_vowel_position ĐÃ ĐƯỢC NÂNG CẤP LẦN CUỐI ===
-def find_main_vowel_position(word: str) -> int:
-    """
-    Tìm vị trí của nguyên âm chính để đặt dấu thanh, tuân thủ quy tắc âm tiết đóng/mở.
-    """
-    word_lower = word.lower()
-    
-    # 1. Ưu tiên cao nhất: các nguyên âm có mũ/móc (ă, â, ê, ô, ơ, ư)
-    for i in range(len(word_lower) - 1, -1, -1):
-        if word_lower[i] in VOWELS_WITH_HAT_OR_HOOK:
-            return i
-            
-    # 2. Xử lý các cụm nguyên âm, có xét đến âm tiết đóng/mở
-    found_cluster_pos = -1
-    best_match_pos = -1
-
-    for cluster, default_relative_pos in VOWEL_CLUSTERS_ACCENT_PRIORITY:
-        pos = word_lower.rfind(cluster)
-        if pos != -1:
-            # Quy tắc đặc biệt cho cụm 'gi' và 'qu'
-            if default_relative_pos == -1: # Dấu hiệu cho 'gi' và 'qu'
-                # Tìm nguyên âm ngay sau 'gi' hoặc 'qu'
-                start_search = pos + len(cluster)
-                for i in range(start_search, len(word_lower)):
-                    if word_lower[i] in VOWELS_WITH_HAT_OR_HOOK + VOWELS_PLAIN:
-                        # Phân tích phần còn lại của từ để đặt dấu chính xác
-                        sub_word_analysis = word_lower[i:]
-                        sub_pos = find_main_vowel_position(sub_word_analysis)
-                        return i + sub_pos if sub_pos != -1 else i
-                continue # Nếu không có nguyên âm nào sau, bỏ qua
-
-            # === LOGIC MỚI: XỬ LÝ ÂM TIẾT ĐÓNG/MỞ ===
-            cluster_len = len(cluster)
-            
-            # Kiểm tra xem có phụ âm đi theo sau cụm không
-            is_closed_syllable = (pos + cluster_len < len(word_lower)) and \
-                                 (word_lower[pos + cluster_len] not in VOWELS_PLAIN)
-
-            # Quy tắc: Với nguyên âm đôi, nếu âm tiết đóng, dấu đặt ở nguyên âm thứ 2.
-            # Áp dụng cho các cụm có `a,o,e,u` đứng đầu.
-            if cluster_len == 2 and is_closed_syllable:
-                 # Ghi đè quy tắc, đặt dấu vào ký tự thứ 2 (index 1)
-                 best_match_pos = pos + 1
-                 return best_match_pos
-
-            # Nếu không, áp dụng quy tắc mặc định
-            best_match_pos = pos + default_relative_pos
-            return best_match_pos
-
-    # 3. Trường hợp cuối cùng: tìm nguyên âm đơn cuối cùng
-    for i in range(len(word_lower) - 1, -1, -1):
-        if word_lower[i] in VOWELS_PLAIN:
-            return i
-            
-    return -1
-
-# Các hàm phụ trợ (GIỮ NGUYÊN)
-def transform_char_case(original_char, transformed_char_base):
-    if not original_char or not transformed_char_base: return transformed_char_base
-    if original_char.isupper(): return transformed_char_base.upper()
-    return transformed_char_base.lower()
-
-def apply_telex_rule_to_char_or_cluster(target_segment, rule_char):
-    lower_target = target_segment.lower()
-    if lower_target in CHAR_MAP and rule_char in CHAR_MAP[lower_target]:
-        result = CHAR_MAP[lower_target][rule_char]
-        if target_segment.isupper() and len(target_segment) > 1: return result.upper()
-        return transform_char_case(target_segment[0], result)
-    return None
-
-def _unaccent_char_logic(char_input):
-    lower_char = char_input.lower()
-    removed_tone_char = TONE_REMOVE_MAP.get(lower_char)
-    if removed_tone_char and removed_tone_char != lower_char: return transform_char_case(char_input, removed_tone_char)
-    removed_hat_char = HAT_REMOVE_MAP.get(lower_char)
-    if removed_hat_char and removed_hat_char != lower_char: return transform_char_case(char_input, removed_hat_char)
-    return char_input
-
-def apply_unaccent_rule(word_in):
-    main_vowel_pos = find_main_vowel_position(word_in)
-    if main_vowel_pos == -1: return word_in
-    original_char_at_pos = word_in[main_vowel_pos]
-    transformed_char = _unaccent_char_logic(original_char_at_pos)
-    if transformed_char == original_char_at_pos: return word_in
-    return word_in[:main_vowel_pos] + transformed_char + word_in[main_vowel_pos+1:]
-
-# Hàm apply_word_telex (GIỮ NGUYÊN - nó đã sử dụng find_main_vowel_position)
-def apply_word_telex(word_in):
-    if not word_in: return None
-    last_char = word_in[-1].lower()
-    word_base = word_in[:-1]
-    if last_char == 'd' and len(word_in) >= 2 and word_in[-2].lower() == 'd':
-        return word_in[:-2] + apply_telex_rule_to_char_or_cluster('d', 'd')
-    if last_char == 'z':
-        if not word_base: return None
-        return apply_unaccent_rule(word_base)
-    if last_char == 'w':
-        if not word_base: return None
-        for length in range(2, 0, -1):
-            if len(word_base) >= length:
-                segment_to_check = word_base[-length:]
-                transformed = apply_telex_rule_to_char_or_cluster(segment_to_check, 'w')
-                if transformed: return word_base[:-length] + transformed
-        return None
-    if last_char in ACCENT_MARKS:
-        if not word_base: return None
-        accent_pos = find_main_vowel_position(word_base)
-        if accent_pos != -1:
-            char_to_accent = word_base[accent_pos]
-            for cluster_rule, _ in VOWEL_CLUSTERS_ACCENT_PRIORITY:
-                 # Logic for handling full clusters like uyê is complex but find_main_vowel_position helps simplify
-                 # Let's try to accent the single char first
-                 pass
-            transformed_char = apply_telex_rule_to_char_or_cluster(char_to_accent, last_char)
-            if transformed_char:
-                return word_base[:accent_pos] + transformed_char + word_base[accent_pos+1:]
-    if len(word_in) >= 2 and word_in[-1].lower() == word_in[-2].lower():
-        double_char = word_in[-1].lower()
-        if double_char in ['a', 'e', 'o']:
-            rule = double_char * 2
-            transformed = apply_telex_rule_to_char_or_cluster(double_char, rule)
-            if transformed: return word_in[:-2] + transform_char_case(word_in[-2], transformed)
-    return None
-
-# --- Keyboard handling và các phần còn lại (GIỮ NGUYÊN) ---
-# ... (Toàn bộ phần code từ process_keyboard_event trở đi không thay đổi) ...
-def process_keyboard_event(e):
-    global current_word_buffer
-    if not is_telex_enabled: return False
-    if e.event_type != keyboard.KEY_DOWN: return False
-    key_name = e.name
-    if (keyboard.is_pressed('ctrl') or keyboard.is_pressed('alt')) and len(key_name) == 1:
-        current_word_buffer = "" 
-        return False
-    if key_name in ['space', 'enter', 'tab']:
-        if current_word_buffer:
-            # We don't do a final transform on word-break keys anymore. 
-            # Transformations happen live.
-            pass
-        current_word_buffer = ""
-        return False 
-    elif key_name == 'backspace':
-        if current_word_buffer:
-            current_word_buffer = current_word_buffer[:-1]
-        return False
-    if len(key_name) > 1 and key_name not in ['space', 'enter', 'tab', 'backspace']:
-        current_word_buffer = ""
-        return False
-    char = e.name
-    current_word_buffer += char
-    transformed_word = apply_word_telex(current_word_buffer)
-    if transformed_word and transformed_word != current_word_buffer:
-        keyboard.write('\b' * len(current_word_buffer))
-        keyboard.write(transformed_word)
-        current_word_buffer = transformed_word
-        return True
-    # Logic for re-applying accents
-    elif len(current_word_buffer) > 1 and current_word_buffer[-1].lower() in ACCENT_MARKS:
-        base = current_word_buffer[:-1]
-        key = current_word_buffer[-1].lower()
-        pos = find_main_vowel_position(base)
-        if pos != -1:
-            char_to_accent = base[pos]
-            transformed_char = apply_telex_rule_to_char_or_cluster(char_to_accent, key)
-            if transformed_char:
-                new_word = base[:pos] + transformed_char + base[pos+1:]
-                keyboard.write('\b' * len(current_word_buffer))
-                keyboard.write(new_word)
-                current_word_buffer = new_word
-                return True
-    return False
+# --headless: chỉ bộ gõ, hook, phím tắt và kênh lệnh; không nạp Qt (máy kiosk, thin client)
+if __name__ == "__main__" and "--headless" in sys.argv:
+    from vietpy_telex_headless import run_headless
+    load_config()
+    sys.exit(run_headless(config, save_config, single_instance, STARTED_AT))
 
-def start_keyboard_listener():
-    global keyboard_hook, current_word_buffer
-    if keyboard_hook is None:
-        print("Starting keyboard listener...")
-        current_word_buffer = ""
-        keyboard_hook = keyboard.on_press(process_keyboard_event, suppress=False) 
-        print("Keyboard listener started.")
-
-def stop_keyboard_listener():
-    global keyboard_hook
-    if keyboard_hook:
-        print("Stopping keyboard listener...")
-        keyboard.unhook(keyboard_hook)
-        keyboard_hook = None
-        print("Keyboard listener stopped.")
-        
-# --- Các hàm và lớp GUI còn lại không thay đổi ---
+from PyQt6.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+    QPushButton, QLabel, QSystemTrayIcon, QMenu, QFileDialog,
+    QMessageBox, QCheckBox, QDialog, QGridLayout, QRadioButton, QGroupBox
+)
+from PyQt6.QtGui import QIcon, QAction, QPixmap, QFont, QCloseEvent, QPainter, QColor, QActionGroup
+from PyQt6.QtCore import Qt, QCoreApplication, pyqtSignal
+
+# --- Khởi động cùng hệ thống, cửa sổ cài đặt và cửa sổ chính ---
 def add_to_startup():
     if platform.system() == "Windows":
         try:
@@ -363,7 +111,7 @@ class SettingsWindow(QDialog):
     def __init__(self, parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.setWindowTitle("Cài đặt VietPy Telex")
-        self.setFixedSize(400, 440)  # Tăng kích thước cửa sổ
+        self.setFixedSize(400, 600)  # Tăng kích thước cửa sổ (thêm nhóm thống kê)
         self.setWindowFlags(self.windowFlags() | Qt.WindowType.WindowStaysOnTopHint)
         if parent:
             self.setWindowIcon(parent.windowIcon())
@@ -516,6 +264,25 @@ class SettingsWindow(QDialog):
         sound_layout.addWidget(self.reset_sound_button)
         
         main_layout.addWidget(sound_group)
+
+        # Nhóm thống kê độ trễ của bộ gõ
+        stats_group = QGroupBox("Thống kê")
+        stats_layout = QVBoxLayout(stats_group)
+        stats_layout.setSpacing(4)
+        stats_layout.setContentsMargins(10, 8, 10, 8)
+        self.stats_label = QLabel()
+        self.stats_label.setWordWrap(True)
+        stats_layout.addWidget(self.stats_label)
+        stats_button_layout = QHBoxLayout()
+        self.refresh_stats_button = QPushButton("Làm mới")
+        self.refresh_stats_button.clicked.connect(self.refresh_stats)
+        stats_button_layout.addWidget(self.refresh_stats_button)
+        self.dump_stats_button = QPushButton("Lưu JSON...")
+        self.dump_stats_button.clicked.connect(self.dump_stats)
+        stats_button_layout.addWidget(self.dump_stats_button)
+        stats_button_layout.addStretch(1)
+        stats_layout.addLayout(stats_button_layout)
+        main_layout.addWidget(stats_group)
         main_layout.addStretch(1)
         button_layout = QHBoxLayout()
         button_layout.addStretch(1)
@@ -538,7 +305,27 @@ class SettingsWindow(QDialog):
             self.sound_path_label.setText(os.path.basename(custom_sound))
         else:
             self.sound_path_label.setText(config.get("sound_file", "default.wav"))
+        self.refresh_stats()
             
+    def session_metrics(self) -> Optional[TelexMetrics]:
+        parent = self.parent()
+        return parent.session.metrics if isinstance(parent, VietPyTelexApp) else None
+
+    def refresh_stats(self):
+        metrics = self.session_metrics()
+        self.stats_label.setText(metrics.summary() if metrics else "Không có dữ liệu")
+
+    def dump_stats(self):
+        metrics = self.session_metrics()
+        if metrics is None: return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Lưu thống kê", os.path.join(CONFIG_DIR, "telex_metrics.json"), "JSON (*.json)")
+        if file_path:
+            try:
+                metrics.dump(file_path)
+            except OSError as e:
+                QMessageBox.warning(self, "Lỗi", f"Không thể lưu thống kê: {str(e)}")
+
     def browse_sound_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "Chọn file âm thanh",
@@ -549,6 +336,7 @@ class SettingsWindow(QDialog):
             try:
                 # Copy file vào thư mục sounds với tên mới
                 sound_file_name = f"custom_{os.path.basename(file_path)}"
+                os.makedirs(SOUNDS_DIR, exist_ok=True)
                 new_path = os.path.join(SOUNDS_DIR, sound_file_name)
                 copy2(file_path, new_path)
                 config["custom_sound_file"] = new_path
@@ -576,6 +364,10 @@ class SettingsWindow(QDialog):
         
         # Âm thanh
         config["sound_enabled"] = self.sound_enabled_checkbox.isChecked()
+        for widget in QApplication.topLevelWidgets():
+            if isinstance(widget, VietPyTelexApp):
+                widget.load_switch_sound()  # chỉ đọc lại file khi cài đặt âm thanh đổi
+                break
         
         # Theme
         new_theme = "dark" if self.theme_dark_radio.isChecked() else "light"
@@ -612,21 +404,84 @@ class SettingsWindow(QDialog):
         if a0:
             a0.accept()
 
-class VietPyTelexApp(QMainWindow):
+class SoundPlayer:
+    """
+    Phát âm thanh đã nạp sẵn trong bộ nhớ bằng winsound.SND_MEMORY trên một luồng riêng
+    (SND_MEMORY không dùng được với SND_ASYNC). Không làm gì nếu không có winsound.
+    """
+
     def __init__(self):
+        try:
+            import winsound
+        except ImportError:  # winsound chỉ có trên Windows
+            winsound = None
+        self.winsound = winsound
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def play(self, data):
+        if self.winsound is None or not data:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="VietPyTelexSound", daemon=True)
+            self._thread.start()
+        self._queue.put(data)
+
+    def _run(self):
+        while True:
+            data = self._queue.get()
+            while not self._queue.empty():  # bật/tắt liên tục: chỉ phát âm thanh mới nhất
+                data = self._queue.get()
+            try:
+                self.winsound.PlaySound(data, self.winsound.SND_MEMORY | self.winsound.SND_NODEFAULT)
+            except RuntimeError as e:
+                print(f"Error playing sound: {e}")
+
+class VietPyTelexApp(QMainWindow):
+    # Phát từ luồng của thư viện keyboard (kèm thời điểm nhấn, ns), xử lý trên luồng GUI
+    hotkey_pressed = pyqtSignal(object)
+    # Phát từ luồng xử lý phím khi watchdog chuyển sang cho qua (kèm bản ghi sự cố)
+    latency_incident = pyqtSignal(object)
+    # Phát từ luồng kênh lệnh khi một lần chạy khác gửi show/toggle/quit
+    instance_command = pyqtSignal(str)
+    STATE_COLORS = ('#4CAF50', '#D32F2F')  # màu biểu tượng và chữ trạng thái (bật, tắt), giống nhau ở mọi theme
+
+    def __init__(self, install_hooks=True):
+        """install_hooks=False: không gắn hook bàn phím/phím tắt và không gửi phím (dùng khi đo, vd: bench_telex.py)."""
         super().__init__()
         self.setWindowTitle("VietPy Telex")
         self.setFixedSize(380, 170)
         self.settings_window: Optional[SettingsWindow] = None
         self.app_icon_base = self.load_app_icon()
-        self.icon_vietnamese = self.create_dynamic_icon('V', '#4CAF50')
-        self.icon_english = self.create_dynamic_icon('E', '#D32F2F')
+        self.visual_cache = {}  # bật/tắt -> biểu tượng, ảnh 32px, chữ trạng thái, tooltip đã vẽ sẵn
+        self.sound_player = SoundPlayer()
+        self.switch_sound = None  # nội dung file âm thanh đã đọc sẵn
+        self.sound_key = None  # cài đặt âm thanh ứng với switch_sound
+        self.install_hooks = install_hooks
         load_config()  # Đảm bảo config đã load trước khi tạo UI
+        self.session = TelexSession(config.get("emitter", "keyboard") if install_hooks else "recording", LatencyWatchdog(
+            config.get("latency_budget_ms", 5), config.get("latency_strikes", 3),
+            config.get("latency_window_s", 10), config.get("latency_cooldown_s", 30)), install_hook=install_hooks,
+            cache_size=config.get("telex_cache_size", 0))
+        self.session.on_incident = self.latency_incident.emit
+        if config.get("keystroke_log"):
+            try:
+                self.session.recorder = KeystrokeRecorder(config["keystroke_log"])
+                print(f"Recording keystrokes to {config['keystroke_log']}")
+            except OSError as e:
+                print(f"Error opening keystroke log: {e}")
+        self.telex_enabled = False
+        self.hotkey_hook = None
+        self.hotkey_pressed.connect(self.hotkey_toggled_state, Qt.ConnectionType.QueuedConnection)
+        self.latency_incident.connect(self.show_latency_incident, Qt.ConnectionType.QueuedConnection)
+        self.instance_command.connect(self.handle_instance_command, Qt.ConnectionType.QueuedConnection)
         self.init_ui()
         self.apply_stylesheet()  # Đảm bảo theme đúng ngay khi khởi tạo
         self.init_tray_icon()
+        self.prepare_state_visuals()
         self.load_settings()
-        self.update_hotkey_listener()
+        if install_hooks:
+            self.update_hotkey_listener()
 
     def create_dynamic_icon(self, text: str, color_hex: str) -> QIcon:
         pixmap = QPixmap(64, 64)
@@ -767,51 +622,81 @@ class VietPyTelexApp(QMainWindow):
 
     def load_settings(self):
         load_config()
+        if self.install_hooks:
+            self.session.set_emitter(config.get("emitter", "keyboard"))
+        self.session.set_cache_size(config.get("telex_cache_size", 0))
+        self.load_switch_sound()
         if platform.system() == "Windows":
             config["auto_start"] = is_in_startup()
         self.set_telex_state(config.get("enabled", False))
 
-    def play_switch_sound(self):
-        if not config.get("sound_enabled", True):
+    def load_switch_sound(self):
+        """Đọc file âm thanh chuyển chế độ vào bộ nhớ; chỉ đọc lại khi cài đặt âm thanh thay đổi."""
+        key = (config.get("sound_enabled", True), config.get("custom_sound_file", ""), config.get("sound_file", "default.wav"))
+        if key == self.sound_key:
+            return
+        self.sound_key = key
+        self.switch_sound = None
+        if not key[0] or self.sound_player.winsound is None:
             return
+        sound_file = key[1]
+        if not sound_file or not os.path.exists(sound_file):
+            sound_file = os.path.join(SOUNDS_DIR, key[2])
         try:
-            sound_file = config.get("custom_sound_file", "")
-            if not sound_file or not os.path.exists(sound_file):
-                sound_file = os.path.join(SOUNDS_DIR, config.get("sound_file", "default.wav"))
-            if os.path.exists(sound_file):
-                winsound.PlaySound(sound_file, winsound.SND_FILENAME | winsound.SND_ASYNC)
-        except Exception as e:
-            print(f"Error playing sound: {e}")
+            with open(sound_file, 'rb') as f:
+                self.switch_sound = f.read()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error loading sound: {e}")
+
+    def play_switch_sound(self):
+        self.sound_player.play(self.switch_sound)
+
+    def state_visuals(self, enabled):
+        """(biểu tượng, ảnh 32px, chữ trạng thái, tooltip) của một trạng thái; chỉ vẽ lần đầu."""
+        visuals = self.visual_cache.get(enabled)
+        if visuals is None:
+            color = self.STATE_COLORS[0 if enabled else 1]
+            icon = self.create_dynamic_icon('V' if enabled else 'E', color)
+            status = "Đang bật" if enabled else "Đang tắt"
+            tooltip = "VietPy Telex - Tiếng Việt" if enabled else "VietPy Telex - Tiếng Anh"
+            visuals = (icon, icon.pixmap(32, 32), f"<span style='color:{color};'>{status}</span>", tooltip)
+            self.visual_cache[enabled] = visuals
+        return visuals
+
+    def prepare_state_visuals(self):
+        """Vẽ sẵn cả hai trạng thái, để lúc bật/tắt không phải vẽ."""
+        self.state_visuals(True)
+        self.state_visuals(False)
+
+    def apply_state_visuals(self):
+        icon, pixmap, status_html, tooltip = self.state_visuals(self.telex_enabled)
+        self.status_icon_label.setPixmap(pixmap)
+        self.status_text_label.setText(status_html)
+        self.tray_icon.setIcon(icon)
+        self.tray_icon.setToolTip(tooltip)
 
     def set_telex_state(self, enabled: bool):
-        global is_telex_enabled
-        if is_telex_enabled == enabled:
+        if self.telex_enabled == enabled:
             return
-        is_telex_enabled = enabled
+        self.telex_enabled = enabled
         config["enabled"] = enabled
         save_config()
-        # Cập nhật trạng thái đẹp hơn: icon + text lớn, màu nổi bật
+        # Cập nhật trạng thái: icon + text lớn đã vẽ sẵn (state_visuals), không đọc file hay vẽ lại
+        self.apply_state_visuals()
         if enabled:
-            self.status_icon_label.setPixmap(self.icon_vietnamese.pixmap(32, 32))
-            self.status_text_label.setText("<span style='color:#4CAF50;'>Đang bật</span>")
-            self.tray_icon.setIcon(self.icon_vietnamese)
-            self.tray_icon.setToolTip("VietPy Telex - Tiếng Việt")
             self.vietnamese_radio.setChecked(True)
-            start_keyboard_listener()
         else:
-            self.status_icon_label.setPixmap(self.icon_english.pixmap(32, 32))
-            self.status_text_label.setText("<span style='color:#D32F2F;'>Đang tắt</span>")
-            self.tray_icon.setIcon(self.icon_english)
-            self.tray_icon.setToolTip("VietPy Telex - Tiếng Anh")
             self.english_radio.setChecked(True)
-            stop_keyboard_listener()
+        self.session.set_enabled(enabled)
         self.update_tray_menu_state()
         # Phát âm thanh khi chuyển đổi
         self.play_switch_sound()
 
     def update_tray_menu_state(self):
-        self.enable_action.setChecked(is_telex_enabled)
-        self.disable_action.setChecked(not is_telex_enabled)
+        self.enable_action.setChecked(self.telex_enabled)
+        self.disable_action.setChecked(not self.telex_enabled)
 
     def hide_to_tray_and_show_info(self):
         self.hide()
@@ -824,8 +709,10 @@ class VietPyTelexApp(QMainWindow):
     def on_tray_activated(self, reason: QSystemTrayIcon.ActivationReason):
         # Click trái: chuyển đổi nhanh chế độ Telex, DoubleClick: mở cửa sổ
         if reason == QSystemTrayIcon.ActivationReason.Trigger:
-            self.set_telex_state(not is_telex_enabled)
-            status = "Tiếng Việt" if is_telex_enabled else "Tiếng Anh"
+            pressed_at = time.perf_counter_ns()
+            self.set_telex_state(not self.telex_enabled)
+            self.record_toggle_latency(pressed_at)
+            status = "Tiếng Việt" if self.telex_enabled else "Tiếng Anh"
             self.tray_icon.showMessage("VietPy Telex", f"Chế độ gõ: {status}", self.windowIcon(), 1000)
         elif reason == QSystemTrayIcon.ActivationReason.DoubleClick:
             self.show_window()
@@ -915,8 +802,7 @@ class VietPyTelexApp(QMainWindow):
     def reset_to_default(self):
         reply = QMessageBox.question(self, "Mặc định", "Bạn có chắc chắn muốn đặt lại tất cả cài đặt về mặc định không?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            global config
-            config = DEFAULT_CONFIG.copy()
+            config.reset()
             if platform.system() == "Windows":
                 if is_in_startup(): remove_from_startup()
                 config["auto_start"] = False
@@ -928,32 +814,56 @@ class VietPyTelexApp(QMainWindow):
             QMessageBox.information(self, "Mặc định", "Đã đặt lại cài đặt về mặc định.")
 
     def quit_app(self):
-        stop_keyboard_listener()
-        keyboard.unhook_all()
+        self.session.close()
+        if self.install_hooks:
+            import keyboard
+            keyboard.unhook_all()
         self.tray_icon.hide()
         instance = QCoreApplication.instance()
         if instance: instance.quit()
 
     def update_hotkey_listener(self):
-        global active_hotkey_hook
-        if active_hotkey_hook:
-            try: keyboard.remove_hotkey(active_hotkey_hook)
+        import keyboard  # chỉ nạp hook hệ thống khi đăng ký phím tắt
+        if self.hotkey_hook:
+            try: keyboard.remove_hotkey(self.hotkey_hook)
             except (KeyError, ValueError): pass
-            active_hotkey_hook = None
+            self.hotkey_hook = None
         hotkey_combo = "alt+z" if config.get("hotkey") == "alt_z" else "ctrl+shift"
-        active_hotkey_hook = keyboard.add_hotkey(
-            hotkey_combo, lambda: self.hotkey_toggled_state(), suppress=True
+        # Callback chạy trên luồng keyboard khi mọi phím đang bị chặn: chỉ phát tín hiệu rồi trả về
+        self.hotkey_hook = keyboard.add_hotkey(
+            hotkey_combo, lambda: self.hotkey_pressed.emit(time.perf_counter_ns()), suppress=True
         )
         print(f"Hotkey '{hotkey_combo}' registered.")
 
-    def hotkey_toggled_state(self):
-        self.set_telex_state(not is_telex_enabled)
+    def hotkey_toggled_state(self, pressed_at):
+        self.set_telex_state(not self.telex_enabled)
+        self.record_toggle_latency(pressed_at)
         if self.isVisible():
             QApplication.alert(self)
         else:
-            status = "Tiếng Việt" if is_telex_enabled else "Tiếng Anh"
+            status = "Tiếng Việt" if self.telex_enabled else "Tiếng Anh"
             self.tray_icon.showMessage("VietPy Telex", f"Chế độ gõ: {status}", self.windowIcon(), 1000)
 
+    def handle_instance_command(self, command):
+        if command == "show":
+            self.show_window()
+        elif command == "toggle":
+            self.hotkey_toggled_state(time.perf_counter_ns())
+        elif command == "quit":
+            self.quit_app()
+
+    def show_latency_incident(self, incident):
+        self.tray_icon.showMessage(
+            "VietPy Telex",
+            f"Bộ gõ xử lý chậm ({incident['elapsed_ms']:.1f} ms) ở phím \"{incident['keys']}\" "
+            f"trong từ \"{incident['word']}\". "
+            f"Tạm cho phím đi qua trong {incident['cooldown_s']:.0f} giây.",
+            QSystemTrayIcon.MessageIcon.Warning, 5000)
+
+    def record_toggle_latency(self, pressed_at):
+        # Từ lúc nhấn phím tắt/khay tới khi bật/tắt xong; xem trong thống kê cài đặt hoặc file JSON
+        self.session.metrics.toggle.record(time.perf_counter_ns() - pressed_at)
+
 def is_in_startup():
     if platform.system() == "Windows":
         try:
@@ -972,6 +882,10 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)
     main_window = VietPyTelexApp()
+    try:
+        single_instance.listen(main_window.instance_command.emit)
+    except OSError as e:
+        print(f"Error opening instance channel: {e}")
     # Silent start logic
     silent = False
     if config.get("auto_start", False):
@@ -984,4 +898,10 @@ if __name__ == "__main__":
         # Không show window, chỉ chạy nền
     else:
         main_window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    peak_kb = peak_memory_kb()
+    print(f"Ready in {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms"
+          + (f", peak memory {peak_kb / 1024:.1f} MB." if peak_kb else "."))
+    exit_code = app.exec()
+    config.flush()
+    single_instance.close()
+    sys.exit(exit_code)
\ No newline at end of file
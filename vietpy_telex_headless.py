@@ -0,0 +1,66 @@
+# --- vietpy_telex_headless.py ---
+# Chế độ nền không giao diện (máy kiosk, thin client): chỉ bộ gõ, hook bàn phím, phím tắt và kênh lệnh.
+# Không nạp Qt, Tk hay PIL. Run: python vietpy_telex_gui.py --headless
+# Điều khiển: phím tắt trong config.json, hoặc chạy lại với --toggle / --quit (--show in trạng thái).
+
+import time
+import queue
+
+from vietpy_telex_core import KeystrokeRecorder, LatencyWatchdog, TelexSession, peak_memory_kb
+
+COMMAND_POLL_S = 0.5  # chờ lệnh có giới hạn để Ctrl+C dừng được vòng lặp chính (cả trên Windows)
+
+def print_incident(incident):
+    print(f"Slow key processing ({incident['elapsed_ms']:.1f} ms on \"{incident['keys']}\"). "
+          f"Passing keys through for {incident['cooldown_s']:.0f}s.")
+
+def run_headless(config, save_config, single_instance, started_at):
+    """Chạy bộ gõ tới khi nhận lệnh quit hoặc Ctrl+C; trả về mã thoát. `config` là một ConfigStore."""
+    import keyboard
+    session = TelexSession(config.get("emitter", "keyboard"), LatencyWatchdog(
+        config.get("latency_budget_ms", 5), config.get("latency_strikes", 3),
+        config.get("latency_window_s", 10), config.get("latency_cooldown_s", 30)),
+        cache_size=config.get("telex_cache_size", 0))
+    session.on_incident = print_incident
+    if config.get("keystroke_log"):
+        try:
+            session.recorder = KeystrokeRecorder(config["keystroke_log"])
+            print(f"Recording keystrokes to {config['keystroke_log']}")
+        except OSError as e:
+            print(f"Error opening keystroke log: {e}")
+    # Phím tắt và kênh lệnh chỉ đưa lệnh vào hàng đợi; bật/tắt hook chạy trên luồng chính
+    commands = queue.SimpleQueue()
+    hotkey_combo = "alt+z" if config.get("hotkey") == "alt_z" else "ctrl+shift"
+    keyboard.add_hotkey(hotkey_combo, lambda: commands.put("toggle"), suppress=True)
+    try:
+        single_instance.listen(commands.put)
+    except OSError as e:
+        print(f"Error opening instance channel: {e}")
+    enabled = config.get("enabled", False)
+    session.set_enabled(enabled)
+    peak_kb = peak_memory_kb()
+    # Cùng câu "Ready in ..." với bản đầy đủ để so trực tiếp hai chế độ
+    print(f"Ready in {(time.perf_counter() - started_at) * 1000:.0f} ms"
+          + (f", peak memory {peak_kb / 1024:.1f} MB." if peak_kb else ".")
+          + f" Headless mode, hotkey '{hotkey_combo}'. Vietnamese typing {'on' if enabled else 'off'}.")
+    try:
+        while True:
+            try:
+                command = commands.get(timeout=COMMAND_POLL_S)
+            except queue.Empty:
+                continue
+            if command == "quit":
+                break
+            if command == "toggle":
+                enabled = not enabled
+                session.set_enabled(enabled)
+                config["enabled"] = enabled
+                save_config()
+            print(f"Vietnamese typing {'on' if enabled else 'off'}.")
+    except KeyboardInterrupt:
+        pass
+    session.close()
+    keyboard.unhook_all()
+    config.flush()
+    single_instance.close()
+    return 0
@@ -0,0 +1,108 @@
+# --- vietpy_telex_instance.py ---
+# Chỉ cho một tiến trình VietPy Telex (một hook bàn phím) chạy; lần chạy sau gửi lệnh cho bản đang chạy rồi thoát.
+# Chỉ dùng thư viện chuẩn để lần chạy sau thoát ngay mà không phải nạp Qt/Tk.
+
+import os
+import sys
+import time
+import threading
+
+INSTANCE_COMMANDS = ("show", "toggle", "quit")
+CONNECT_TIMEOUT_S = 2.0  # bản đang chạy có thể vẫn đang khởi động, chưa mở kênh lệnh
+MAX_COMMAND_BYTES = 64
+
+def command_from_argv(argv):
+    """Lệnh gửi cho bản đang chạy: --toggle, --quit, mặc định là show (hiện cửa sổ)."""
+    for command in INSTANCE_COMMANDS:
+        if f"--{command}" in argv:
+            return command
+    return "show"
+
+class SingleInstance:
+    """
+    Khóa file trong thư mục cấu hình (fcntl.flock / msvcrt.locking, hệ điều hành tự nhả khi tiến trình
+    chết) cộng một kênh lệnh cục bộ: Unix socket cạnh file khóa, hoặc named pipe trên Windows.
+    Chỉ trao đổi chuỗi byte (send_bytes/recv_bytes), không unpickle dữ liệu nhận được.
+    """
+
+    def __init__(self, directory, name="VietPyTelex"):
+        self.lock_path = os.path.join(directory, "instance.lock")
+        if sys.platform == "win32":
+            self.family = "AF_PIPE"
+            self.address = rf"\\.\pipe\{name}-{os.environ.get('USERNAME', '')}"
+        else:
+            self.family = "AF_UNIX"
+            self.address = os.path.join(directory, "instance.sock")
+        self._lock_file = None
+        self._listener = None
+
+    def acquire(self) -> bool:
+        """Giữ khóa; False nếu đã có bản khác đang chạy."""
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, 'a+b')
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def send(self, command) -> int:
+        """Gửi lệnh cho bản đang chạy; trả về mã thoát cho lần chạy này."""
+        from multiprocessing.connection import Client
+        deadline = time.monotonic() + CONNECT_TIMEOUT_S
+        while True:
+            try:
+                with Client(self.address, family=self.family) as conn:
+                    conn.send_bytes(command.encode('ascii'))
+                    reply = conn.recv_bytes(MAX_COMMAND_BYTES)
+                break
+            except (OSError, EOFError) as e:
+                if time.monotonic() >= deadline:
+                    print(f"VietPy Telex is already running but did not answer: {e}")
+                    return 1
+                time.sleep(0.05)
+        if reply != b"ok":
+            print(f"VietPy Telex is already running and rejected '{command}'.")
+            return 1
+        print(f"VietPy Telex is already running. Sent '{command}'.")
+        return 0
+
+    def listen(self, on_command):
+        """Mở kênh lệnh; on_command(command) được gọi trên luồng nền của kênh, nên chỉ được chuyển tiếp lời gọi."""
+        from multiprocessing.connection import Listener
+        if self.family == "AF_UNIX" and os.path.exists(self.address):
+            os.unlink(self.address)  # socket cũ của lần chạy bị dừng đột ngột; đang giữ khóa nên xóa an toàn
+        self._listener = Listener(self.address, family=self.family)
+        threading.Thread(target=self._serve, args=(self._listener, on_command),
+                         name="VietPyTelexInstance", daemon=True).start()
+
+    def _serve(self, listener, on_command):
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return  # kênh đã đóng
+            with conn:
+                try:
+                    command = conn.recv_bytes(MAX_COMMAND_BYTES).decode('ascii', 'replace')
+                    conn.send_bytes(b"ok" if command in INSTANCE_COMMANDS else b"unknown")
+                except (OSError, EOFError):
+                    continue
+            if command in INSTANCE_COMMANDS:
+                on_command(command)
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None